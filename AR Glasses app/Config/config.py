@@ -90,8 +90,10 @@ TESSERACT_CMD = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 API_BASE_URL = "http://127.0.0.1:8000/api/"
 API_CHAT_ENDPOINT = f"{API_BASE_URL}chat/"
 API_TRANSCRIBE_ENDPOINT = f"{API_BASE_URL}transcribe-audio/"
+API_VOICE_CHAT_ENDPOINT = f"{API_BASE_URL}voice-chat/"
 API_LOGIN_ENDPOINT = f"{API_BASE_URL}users/login/"
 API_REFRESH_TOKEN_ENDPOINT = f"{API_BASE_URL}users/token/refresh/"
+API_WS_ENDPOINT = "ws://127.0.0.1:8000/ws/glasses/"
 
 # Camera/UI settings
 LABELS_WIDTH_PERCENT = 0.3
@@ -363,15 +363,11 @@ class InteractionManager:
             elif command == "go":
                 self.audio_recorder.stop()
                 try:
-                    whisper_response = self.api.send_audio_to_api(
+                    # Transcription, control-word stripping and the answer all happen in one request
+                    _, api_response = self.api.send_voice_chat_to_api(
                         self.audio_recorder.filename,
-                        update_user_name=self.ui.update_user_name
-                    )
-                    self.ui.display_output6(whisper_response)
-                    text = InteractionManager.strip_words(whisper_response, ["stop", "wait", "continue"])
-                    api_response = self.api.send_chat_to_api(
-                        text,
                         image_path=last_captured_image,
+                        on_transcript=self.ui.display_output6,
                         update_user_name=self.ui.update_user_name
                     )
                     self.ui.display_output5(api_response)
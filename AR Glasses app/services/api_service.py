@@ -1,11 +1,35 @@
 import os
+import json
 import requests
 import socket
 import mimetypes
-from Config.config import API_CHAT_ENDPOINT, API_TRANSCRIBE_ENDPOINT, API_LOGIN_ENDPOINT, API_REFRESH_TOKEN_ENDPOINT
+from Config.config import API_CHAT_ENDPOINT, API_TRANSCRIBE_ENDPOINT, API_VOICE_CHAT_ENDPOINT, API_LOGIN_ENDPOINT, API_REFRESH_TOKEN_ENDPOINT
 import subprocess
+import shutil
 
 import platform
+from services.socket_service import GlassesSocket, SocketUnavailable
+
+
+def compress_audio(audio_path, bitrate="24k"):
+    """Re-encode a WAV recording as Ogg/Opus for upload (~10x smaller).
+
+    Returns (path, mime_type); falls back to the original WAV when ffmpeg
+    is not available or the conversion fails.
+    """
+    if not shutil.which("ffmpeg"):
+        return audio_path, 'audio/wav'
+
+    opus_path = os.path.splitext(audio_path)[0] + ".ogg"
+    try:
+        subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-i", audio_path,
+             "-c:a", "libopus", "-b:a", bitrate, "-application", "voip", opus_path],
+            check=True
+        )
+        return opus_path, 'audio/ogg'
+    except (subprocess.CalledProcessError, OSError):
+        return audio_path, 'audio/wav'
 
 
 
@@ -89,6 +113,7 @@ class APIService:
         self.access_token = None
         self.refresh_token = None
         self.status = False
+        self.socket = GlassesSocket(self)
 
 
 
@@ -140,17 +165,19 @@ class APIService:
         
 
     def send_audio_to_api(self, audio_path="recording.wav", update_user_name=None):
-        def make_request():
-            if not os.path.exists(audio_path):
-                return {"error": "Audio file not found"}
+        if not os.path.exists(audio_path):
+            return {"error": "Audio file not found"}
+
+        upload_path, mime_type = compress_audio(audio_path)
 
+        def make_request():
             headers = {
                 "Authorization": f"Bearer {self.access_token}"
             }
 
             try:
-                with open(audio_path, 'rb') as audio_file:
-                    files = {'audio': (os.path.basename(audio_path), audio_file, 'audio/wav')}
+                with open(upload_path, 'rb') as audio_file:
+                    files = {'audio': (os.path.basename(upload_path), audio_file, mime_type)}
                     response = requests.post(API_TRANSCRIBE_ENDPOINT, files=files, headers=headers, timeout=20)
                 return response
             except requests.RequestException as e:
@@ -217,4 +244,76 @@ class APIService:
         if response.status_code == 200:
             return response.json().get("response", "").strip()
         else:
-            return f"Error: {response.status_code} - {response.text}"
\ No newline at end of file
+            return f"Error: {response.status_code} - {response.text}"
+
+
+    def send_voice_chat_to_api(self, audio_path="recording.wav", image_path=None, on_transcript=None, update_user_name=None):
+        """Transcribe and answer a spoken question in one streamed request.
+
+        Calls on_transcript(text) as soon as the server has transcribed the
+        audio and returns (transcript, answer). Uses the open WebSocket
+        channel when it can, and a streamed HTTP request otherwise.
+        """
+        if not os.path.exists(audio_path):
+            return None, "Error: Audio file not found"
+
+        upload_path, mime_type = compress_audio(audio_path)
+
+        try:
+            return self.socket.voice_chat(upload_path, image_path, on_transcript, update_user_name)
+        except SocketUnavailable:
+            pass
+
+        def make_request():
+            headers = {"Authorization": f"Bearer {self.access_token}"}
+            files = {'audio': (os.path.basename(upload_path), open(upload_path, 'rb'), mime_type)}
+            if image_path and os.path.exists(image_path):
+                image_mime_type, _ = mimetypes.guess_type(image_path)
+                files['image'] = (
+                    os.path.basename(image_path),
+                    open(image_path, 'rb'),
+                    image_mime_type or 'application/octet-stream'
+                )
+
+            try:
+                return requests.post(API_VOICE_CHAT_ENDPOINT, files=files, headers=headers, stream=True, timeout=20)
+            except requests.RequestException:
+                return None
+            finally:
+                for _, file_obj, _ in files.values():
+                    file_obj.close()
+
+        response = make_request()
+        if response is None:
+            return None, "Error: Could not connect to API"
+
+        if response.status_code == 401:
+            if self.refresh_access_token(update_user_name):
+                response = make_request()
+                if response is None:
+                    return None, "Error: Could not connect to API"
+            else:
+                return None, "Error: Session expired. Please log in again."
+
+        if response.status_code != 200:
+            return None, f"Error: {response.status_code} - {response.text}"
+
+        transcript = None
+        answer = ""
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data: "):
+                    continue
+                event = json.loads(line[len("data: "):])
+                if event.get("type") == "transcript":
+                    transcript = event.get("text", "")
+                    if on_transcript:
+                        on_transcript(transcript)
+                elif event.get("type") == "content":
+                    answer += event.get("content", "")
+                elif event.get("type") == "error":
+                    return transcript, f"Error: {event.get('error')}"
+                elif event.get("type") == "complete":
+                    break
+
+        return transcript, answer.strip()
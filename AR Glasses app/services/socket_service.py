@@ -0,0 +1,151 @@
+import json
+import os
+import threading
+import time
+from Config.config import API_WS_ENDPOINT
+
+try:
+    import websocket  # websocket-client
+except ImportError:
+    websocket = None
+
+
+UPLOAD_FRAME_BYTES = 64 * 1024
+# The server pings every 20s; a transcription or the first token can take
+# longer than one gap, so only give up after several missed pings
+RECEIVE_TIMEOUT = 60
+# Re-authenticate this many seconds before the access token expires
+TOKEN_REFRESH_MARGIN = 5
+
+
+class SocketUnavailable(Exception):
+    pass
+
+
+class GlassesSocket:
+    """One long-lived, authenticated connection to the server's glasses channel.
+
+    Requests go out as framed messages on the open connection, so an
+    interaction costs a frame exchange instead of a new HTTP request with
+    its own TCP/TLS setup and JWT check. Raises SocketUnavailable when the
+    channel can't be used, so callers can fall back to HTTP.
+    """
+
+    def __init__(self, api_service):
+        self.api = api_service
+        self.ws = None
+        self.token_expires_at = 0
+        self.next_id = 0
+        self.lock = threading.Lock()
+
+    def close(self):
+        if self.ws is not None:
+            try:
+                self.ws.close()
+            except Exception:
+                pass
+            self.ws = None
+
+    def _recv(self):
+        while True:
+            message = json.loads(self.ws.recv())
+            if message.get("type") != "ping":
+                return message
+
+    def _authenticate(self):
+        """Send the current access token; True once the server accepts it."""
+        self.ws.send(json.dumps({"type": "auth", "token": self.api.access_token}))
+        reply = self._recv()
+        if reply.get("type") != "ready":
+            return False
+        self.token_expires_at = reply.get("expires_at", 0)
+        return True
+
+    def _connect(self, update_user_name):
+        if websocket is None:
+            raise SocketUnavailable("websocket-client is not installed")
+        for attempt in range(2):
+            try:
+                self.ws = websocket.create_connection(API_WS_ENDPOINT, timeout=RECEIVE_TIMEOUT)
+                if self._authenticate():
+                    return
+            except (OSError, ValueError, websocket.WebSocketException) as e:
+                self.close()
+                raise SocketUnavailable(str(e))
+            self.close()
+            if attempt == 0 and not self.api.refresh_access_token(update_user_name):
+                break
+        raise SocketUnavailable("Authentication failed")
+
+    def _ensure_fresh_token(self, update_user_name):
+        """Access tokens are short-lived; the server refuses requests once ours expires."""
+        if time.time() < self.token_expires_at - TOKEN_REFRESH_MARGIN:
+            return
+        if not self.api.refresh_access_token(update_user_name) or not self._authenticate():
+            self.close()
+            raise SocketUnavailable("Could not refresh the access token")
+
+    def _send_upload(self, upload_id, path):
+        prefix = f"{upload_id}\n".encode()
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(UPLOAD_FRAME_BYTES)
+                if not chunk:
+                    break
+                self.ws.send_binary(prefix + chunk)
+
+    def _voice_chat(self, audio_path, image_path, on_transcript, received):
+        self.next_id += 1
+        request_id = str(self.next_id)
+        request = {"type": "voice_chat", "id": request_id}
+        if image_path and os.path.exists(image_path):
+            request["image_id"] = f"{request_id}-image"
+            self._send_upload(request["image_id"], image_path)
+        self._send_upload(request_id, audio_path)
+        self.ws.send(json.dumps(request))
+
+        transcript = None
+        answer = ""
+        while True:
+            event = self._recv()
+            if event.get("id") != request_id:
+                continue
+            received.append(event)
+            if event.get("type") == "transcript":
+                transcript = event.get("text", "")
+                if on_transcript:
+                    on_transcript(transcript)
+            elif event.get("type") == "content":
+                answer += event.get("content", "")
+            elif event.get("type") in ("error", "cancelled"):
+                if not transcript and event.get("code") == "token_expired":
+                    # Refused before any work was done; safe to send again
+                    received.clear()
+                    raise SocketUnavailable(event["error"])
+                return transcript, f"Error: {event.get('error') or event.get('reason')}"
+            elif event.get("type") == "complete":
+                return transcript, answer.strip()
+
+    def voice_chat(self, audio_path, image_path=None, on_transcript=None, update_user_name=None):
+        """Same contract as APIService.send_voice_chat_to_api, over the socket."""
+        if websocket is None:
+            raise SocketUnavailable("websocket-client is not installed")
+        with self.lock:
+            for attempt in range(2):
+                received = []
+                try:
+                    if self.ws is None:
+                        self._connect(update_user_name)
+                    else:
+                        self._ensure_fresh_token(update_user_name)
+                    return self._voice_chat(audio_path, image_path, on_transcript, received)
+                except (OSError, ValueError, SocketUnavailable, websocket.WebSocketException) as e:
+                    self.close()
+                    if received:
+                        # The server accepted the request and may still be working on it:
+                        # sending it again would run it twice
+                        transcript = next((ev.get("text") for ev in received if ev.get("type") == "transcript"), None)
+                        return transcript, "Error: Connection lost or timed out"
+                    # The server closes idle connections; retry once on a fresh one
+                    if attempt == 1:
+                        raise SocketUnavailable(str(e))
@@ -11,6 +11,7 @@ class Message {
   final DateTime timestamp;
   final File? image;
   final String? imageUrl;
+  final Map<String, String>? imageHeaders;
   final bool isError;
   final bool isSending;
   final bool isTyping;
@@ -23,6 +24,7 @@ class Message {
     required this.isUser,
     this.image,
     this.imageUrl,
+    this.imageHeaders,
     this.isError = false,
     this.isSending = false,
     this.isTyping = false,
@@ -136,6 +138,7 @@ class _ChatScreenState extends State<ChatScreen>
   Future<void> _loadChatHistory() async {
     try {
       final history = await _apiService.getChatHistory();
+      final imageHeaders = await _apiService.imageHeaders;
       if (!mounted) return;
 
       setState(() {
@@ -165,6 +168,7 @@ class _ChatScreenState extends State<ChatScreen>
               isFromHistory: true,
               timestamp: timestamp,
               imageUrl: imageUrl,
+              imageHeaders: imageHeaders,
             ),
           );
 
@@ -787,7 +791,10 @@ class _ChatScreenState extends State<ChatScreen>
                                       message.image != null
                                           ? FileImage(message.image!)
                                               as ImageProvider
-                                          : NetworkImage(message.imageUrl!),
+                                          : NetworkImage(
+                                            message.imageUrl!,
+                                            headers: message.imageHeaders,
+                                          ),
                                   fit: BoxFit.cover,
                                   opacity: message.isSending ? 0.7 : 1.0,
                                 ),
@@ -45,6 +45,13 @@ class ApiService {
         {'Accept': 'application/json', 'Content-Type': 'application/json'};
   }
 
+  // History images are served by an authenticated view, so image widgets
+  // need the bearer token too
+  Future<Map<String, String>> get imageHeaders async {
+    final accessToken = await _authService.getValidAccessToken();
+    return accessToken == null ? {} : {'Authorization': 'Bearer $accessToken'};
+  }
+
   Future<bool> isServerReachable() async {
     try {
       final response = await http
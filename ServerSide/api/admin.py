@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import ChatHistory
+from .models import ArchivedChat, ChatHistory, Conversation
 
 admin.site.register(ChatHistory)
+admin.site.register(ArchivedChat)
+admin.site.register(Conversation)
 # Register your models here.
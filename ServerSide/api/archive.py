@@ -0,0 +1,130 @@
+# archive.py
+import logging
+import threading
+import time
+import zlib
+from datetime import timedelta
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from .models import USAGE_FIELDS, ArchivedChat, ChatHistory
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+CODEC_ZSTD = "zstd"
+CODEC_ZLIB = "zlib"
+
+
+def compress_text(text, level=None):
+    """Compress `text` with zstd when installed, zlib otherwise; returns (codec, data)."""
+    level = level or settings.CHAT_ARCHIVE["LEVEL"]
+    raw = text.encode("utf-8")
+    if zstandard is not None:
+        return CODEC_ZSTD, zstandard.ZstdCompressor(level=level).compress(raw)
+    return CODEC_ZLIB, zlib.compress(raw, min(level, 9))
+
+
+def decompress_text(codec, data):
+    data = bytes(data)
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ImproperlyConfigured("Reading zstd-archived chats requires the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(data).decode("utf-8")
+    raise ValueError(f"Unknown archive codec '{codec}'")
+
+
+def _archive_batch(ids, level):
+    """Copy the hot rows `ids` into ArchivedChat and delete them, in one transaction."""
+    text_bytes = stored_bytes = 0
+    with transaction.atomic():
+        rows = []
+        for chat in ChatHistory.objects.filter(id__in=ids).order_by():
+            codec, prompt_data = compress_text(chat.prompt, level)
+            _, response_data = compress_text(chat.response, level)
+            text_bytes += len(chat.prompt.encode("utf-8")) + len(chat.response.encode("utf-8"))
+            stored_bytes += len(prompt_data) + len(response_data)
+            rows.append(ArchivedChat(
+                id=chat.id,
+                user_id=chat.user_id,
+                conversation_id=chat.conversation_id,
+                codec=codec,
+                prompt_data=prompt_data,
+                response_data=response_data,
+                image=chat.image.name or None,
+                source=chat.source,
+                timestamp=chat.timestamp,
+                truncated=chat.truncated,
+                **{field: getattr(chat, field) for field in USAGE_FIELDS},
+            ))
+        ArchivedChat.objects.bulk_create(rows)
+        ChatHistory.objects.filter(id__in=ids).delete()
+    return len(rows), text_bytes, stored_bytes
+
+
+def archive_old_chats(days=None, batch_size=None, pause=None, level=None):
+    """Move ChatHistory rows older than `days` into the compressed archive table.
+
+    Returns a dict with the rows moved, their text size before and after
+    compression in bytes, and the time taken in seconds.
+    """
+    config = settings.CHAT_ARCHIVE
+    days = config["AFTER_DAYS"] if days is None else days
+    batch_size = batch_size or config["BATCH_SIZE"]
+    pause = config["BATCH_PAUSE"] if pause is None else pause
+
+    started = time.monotonic()
+    cutoff = timezone.now() - timedelta(days=days)
+    old = ChatHistory.objects.filter(timestamp__lt=cutoff).order_by("id")
+    archived = text_bytes = stored_bytes = 0
+    while True:
+        ids = list(old.values_list("id", flat=True)[:batch_size])
+        if not ids:
+            break
+        # Each batch is its own short transaction so the table is never locked for long
+        moved, before, after = _archive_batch(ids, level)
+        archived += moved
+        text_bytes += before
+        stored_bytes += after
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return {
+        "archived": archived,
+        "text_bytes": text_bytes,
+        "stored_bytes": stored_bytes,
+        "seconds": round(time.monotonic() - started, 3),
+    }
+
+
+def _run_periodically(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            result = archive_old_chats()
+            logger.info(
+                f"Chat archival moved {result['archived']} rows "
+                f"({result['text_bytes']} -> {result['stored_bytes']} bytes) in {result['seconds']}s"
+            )
+        except Exception as e:
+            logger.error(f"Chat archival failed: {str(e)}")
+        finally:
+            close_old_connections()
+
+
+def start_periodic_archival():
+    """Start the in-process archival thread if CHAT_ARCHIVE["INTERVAL"] is set."""
+    interval = settings.CHAT_ARCHIVE.get("INTERVAL")
+    if not interval:
+        return None
+    thread = threading.Thread(target=_run_periodically, args=(interval,), name="chat-archival", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,81 @@
+# audio.py
+import hashlib
+import wave
+
+# whisper.audio.SAMPLE_RATE; repeated here so importing this module doesn't load whisper/torch
+SAMPLE_RATE = 16000
+
+# Upload formats TranscribeAudioView accepts, by detected container
+AUDIO_SUFFIXES = {
+    "wav": ".wav",
+    "ogg": ".ogg",
+    "flac": ".flac",
+    "webm": ".webm",
+}
+
+
+def detect_audio_format(header):
+    """Identify an upload from its first bytes; returns a key of AUDIO_SUFFIXES or None."""
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return "wav"
+    if header[:4] == b"OggS":
+        return "ogg"  # Opus or Vorbis, ffmpeg handles both
+    if header[:4] == b"fLaC":
+        return "flac"
+    if header[:4] == b"\x1a\x45\xdf\xa3":
+        return "webm"  # EBML header, WebM/Matroska
+    return None
+
+
+def sniff_upload(uploaded_file):
+    """Detect the format of a Django UploadedFile without consuming it."""
+    uploaded_file.seek(0)
+    header = uploaded_file.read(16)
+    uploaded_file.seek(0)
+    return detect_audio_format(header)
+
+
+class HashingChunks:
+    """Pass upload chunks through unchanged while hashing them (sha256)."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self._hash = hashlib.sha256()
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self._hash.update(chunk)
+            yield chunk
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
+def _read_pcm16_wav(path):
+    """Decode 16 kHz mono 16-bit WAV in-process; None if the file is anything else."""
+    import numpy as np
+
+    try:
+        with wave.open(path, "rb") as wf:
+            if (wf.getframerate(), wf.getnchannels(), wf.getsampwidth()) != (SAMPLE_RATE, 1, 2):
+                return None
+            frames = wf.readframes(wf.getnframes())
+    except (wave.Error, EOFError):
+        return None
+    return np.frombuffer(frames, np.int16).astype(np.float32) / 32768.0
+
+
+def load_audio(path, audio_format=None):
+    """Decode an audio file to the float32 16 kHz mono array whisper expects.
+
+    WAV that is already 16 kHz mono PCM is read directly, skipping the
+    ffmpeg subprocess; everything else (Opus/Vorbis in Ogg, FLAC, WebM,
+    other WAV layouts) is decoded and resampled by ffmpeg.
+    """
+    if audio_format in (None, "wav"):
+        audio = _read_pcm16_wav(path)
+        if audio is not None:
+            return audio
+
+    import whisper
+    return whisper.load_audio(path)
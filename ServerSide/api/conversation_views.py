@@ -0,0 +1,48 @@
+# conversation_views.py
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import NotFound
+from rest_framework import status
+from .models import ChatHistory, Conversation
+from .serializers import ConversationSerializer, chat_history_rows
+
+
+def get_request_conversation(request):
+    """The conversation named by the request's `conversation_id`, or None.
+
+    Raises NotFound when the id doesn't belong to the requesting user.
+    """
+    conversation_id = request.data.get('conversation_id') or request.query_params.get('conversation_id')
+    if not conversation_id:
+        return None
+    try:
+        return Conversation.objects.get(pk=int(conversation_id), user=request.user)
+    except (Conversation.DoesNotExist, ValueError, TypeError):
+        raise NotFound("Conversation not found or access denied.")
+
+
+class ConversationListView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        # Served entirely from the (user, -last_message_at) index
+        conversations = Conversation.objects.filter(user=request.user).order_by('-last_message_at')
+        return Response(ConversationSerializer(conversations, many=True).data)
+
+    def post(self, request):
+        serializer = ConversationSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        serializer.save(user=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class ConversationMessagesView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, conversation_id):
+        if not Conversation.objects.filter(pk=conversation_id, user=request.user).exists():
+            return Response({"error": "Conversation not found or access denied."}, status=status.HTTP_404_NOT_FOUND)
+        chats = ChatHistory.objects.filter(conversation_id=conversation_id).order_by('-timestamp')
+        return Response(chat_history_rows(chats))
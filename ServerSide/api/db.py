@@ -0,0 +1,28 @@
+# db.py
+import logging
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+
+def apply_sqlite_pragmas(cursor, pragmas):
+    """Run `PRAGMA name = value` for every entry in `pragmas`."""
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """connection_created handler that tunes every new SQLite connection."""
+    if connection.vendor != "sqlite":
+        return
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", {})
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        apply_sqlite_pragmas(cursor, pragmas)
+    logger.debug(f"Applied SQLite pragmas to connection '{connection.alias}'")
+
+
+def connect_signals():
+    connection_created.connect(configure_sqlite_connection, dispatch_uid="api.db.sqlite_pragmas")
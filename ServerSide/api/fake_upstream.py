@@ -0,0 +1,145 @@
+# fake_upstream.py
+"""A local stand-in for the OpenRouter chat completions API, for load tests.
+
+Each API key may have at most `concurrency` requests in flight and `rate`
+requests per second; anything beyond that gets a 429 with Retry-After, as
+the real upstream does on its rate-limited tiers.
+"""
+import json
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class KeyLimits:
+    def __init__(self, concurrency, rate):
+        self.concurrency = concurrency
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.in_flight = defaultdict(int)
+        self.started = defaultdict(deque)
+        self.served = defaultdict(int)
+        self.rejected = defaultdict(int)
+        self.disconnected = defaultdict(int)
+
+    def admit(self, key):
+        """True if `key` may start a request now; the caller must finish() it."""
+        now = time.monotonic()
+        with self.lock:
+            started = self.started[key]
+            while started and started[0] < now - 1:
+                started.popleft()
+            if self.in_flight[key] >= self.concurrency or len(started) >= self.rate:
+                self.rejected[key] += 1
+                return False
+            self.in_flight[key] += 1
+            started.append(now)
+            return True
+
+    def finish(self, key):
+        with self.lock:
+            self.in_flight[key] -= 1
+            self.served[key] += 1
+
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            return self._send_json(404, {"error": {"message": "Not found"}})
+        key = self.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        limits = self.server.limits
+        if not limits.admit(key):
+            return self._send_json(
+                429, {"error": {"message": "Rate limit exceeded", "code": 429}}, {"Retry-After": "1"}
+            )
+        try:
+            self._complete(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled mid-stream
+            with limits.lock:
+                limits.disconnected[key] += 1
+        finally:
+            limits.finish(key)
+
+    def _complete(self, body):
+        model = body.get("model", "fake")
+        words = ["This", "is", "a", "fake", "answer."]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        if not body.get("stream"):
+            time.sleep(self.server.latency)
+            return self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": " ".join(words)},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 10, "completion_tokens": len(words), "total_tokens": 10 + len(words)},
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for index, word in enumerate(words):
+            time.sleep(self.server.latency / len(words))
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": word if index == 0 else f" {word}"},
+                    "finish_reason": "stop" if index == len(words) - 1 else None,
+                }],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+        if (body.get("stream_options") or {}).get("include_usage"):
+            usage = {"prompt_tokens": 10, "completion_tokens": len(words), "total_tokens": 10 + len(words)}
+            chunk = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created,
+                "model": model, "choices": [], "usage": usage,
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        self.wfile.write(b"data: [DONE]\n\n")
+
+
+def make_server(host="127.0.0.1", port=0, concurrency=2, rate=10, latency=0.1):
+    server = ThreadingHTTPServer((host, port), FakeUpstreamHandler)
+    server.daemon_threads = True
+    server.limits = KeyLimits(concurrency, rate)
+    server.latency = latency
+    return server
+
+
+def start_in_thread(**kwargs):
+    """Start a fake upstream on a free port; returns (server, base_url)."""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, name="fake-upstream", daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/v1"
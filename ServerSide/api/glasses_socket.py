@@ -0,0 +1,351 @@
+# glasses_socket.py
+"""WebSocket channel for the glasses client, served at GLASSES_SOCKET["PATH"].
+
+The client authenticates and then multiplexes requests over the one
+connection. Access tokens are short-lived: once the token expires, new
+requests are refused until the client sends a fresh one in another auth
+frame, and the connection is closed if it doesn't within AUTH_TIMEOUT.
+Chat requests count against SSE_REPLAY["MAX_ACTIVE_PER_USER"] together with
+the user's HTTP streams. Text frames are JSON objects with a `type`;
+requests carry a client-chosen `id` that every reply echoes. Binary frames carry upload
+bytes as `<id>\\n<bytes>` and are appended to upload `id`.
+
+Client to server:
+    {"type": "auth", "token": <access token>}    first frame and on refresh, answered with "ready"
+    {"type": "ping"}                             answered with "pong"
+    {"type": "transcribe", "id", "language"?}    transcribe upload `id`
+    {"type": "voice_chat", "id", "image_id"?, "language"?, "conversation_id"?}
+    {"type": "chat", "id", "prompt", "image_id"?, "conversation_id"?}
+    {"type": "cancel", "id"}
+
+Server to client: {"type": "accepted", "id"} once a request starts, then the
+events of /api/voice-chat/ (transcript, connection, content, complete, error,
+cancelled) with the request `id` added, and a {"type": "ping"} every
+HEARTBEAT seconds.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from .sse_replay import create_stream, finish_stream
+
+logger = logging.getLogger(__name__)
+
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_IDLE = 4408
+# Request types that generate an answer, and so are streams for the per-user cap
+STREAMING_TYPES = ("chat", "voice_chat")
+
+
+class SocketRequest:
+    def __init__(self, request_id, audio=None, image=None):
+        self.id = request_id
+        # Upload bytes, taken off the connection's pending uploads at start
+        self.audio = audio
+        self.image = image
+        self.cancelled = False
+
+
+class GlassesSocket:
+    def __init__(self, scope, receive, send):
+        self.scope = scope
+        self.receive = receive
+        self._send = send
+        self.config = settings.GLASSES_SOCKET
+        self.user = None
+        self.token_expires_at = None
+        self.uploads = {}
+        self.pending_bytes = 0
+        self.requests = {}
+        self.closed = False
+        self.loop = None
+        self.connected_at = self.last_seen = time.monotonic()
+        self._send_lock = asyncio.Lock()
+
+    async def send_json(self, data):
+        if self.closed:
+            return
+        async with self._send_lock:
+            await self._send({"type": "websocket.send", "text": json.dumps(data)})
+
+    async def close(self, code=1000):
+        if not self.closed:
+            self.closed = True
+            await self._send({"type": "websocket.close", "code": code})
+
+    def send_from_thread(self, data):
+        """send_json() for worker threads; waits so a slow client slows its producer."""
+        if self.closed:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.send_json(data), self.loop).result()
+        except Exception as e:
+            logger.error(f"Error sending on glasses socket: {str(e)}")
+
+    async def run(self):
+        message = await self.receive()
+        if message["type"] != "websocket.connect":
+            return
+        await self._send({"type": "websocket.accept"})
+        self.loop = asyncio.get_running_loop()
+        heartbeat = asyncio.create_task(self.heartbeat())
+        try:
+            while True:
+                message = await self.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                self.last_seen = time.monotonic()
+                if message.get("bytes") is not None:
+                    await self.on_bytes(message["bytes"])
+                elif message.get("text") is not None:
+                    await self.on_text(message["text"])
+        finally:
+            self.closed = True
+            heartbeat.cancel()
+            for request in self.requests.values():
+                request.cancelled = True
+
+    async def heartbeat(self):
+        next_ping = time.monotonic() + self.config["HEARTBEAT"]
+        while not self.closed:
+            wait = next_ping - time.monotonic()
+            if not self.requests:
+                # Wake for the auth deadline too, not just the next ping
+                wait = min(wait, self.auth_remaining())
+            await asyncio.sleep(max(wait, 0))
+            now = time.monotonic()
+            if self.auth_remaining() <= 0 and not self.requests:
+                # Requests already running may finish; nothing new starts on an expired token
+                if self.user is not None:
+                    await self.send_json({"type": "error", "code": "token_expired", "error": "Token expired."})
+                await self.close(CLOSE_UNAUTHORIZED)
+            elif now < next_ping:
+                continue
+            elif now - self.last_seen > self.config["IDLE_TIMEOUT"] and not self.requests:
+                await self.close(CLOSE_IDLE)
+            else:
+                next_ping = now + self.config["HEARTBEAT"]
+                await self.send_json({"type": "ping"})
+
+    def auth_remaining(self):
+        """Seconds left to send a first or replacement token before the connection is closed."""
+        if self.user is None:
+            return self.connected_at + self.config["AUTH_TIMEOUT"] - time.monotonic()
+        return self.token_expires_at + self.config["AUTH_TIMEOUT"] - time.time()
+
+    def token_expired(self):
+        return self.user is not None and time.time() >= self.token_expires_at
+
+    async def on_bytes(self, data):
+        if self.user is None:
+            return await self.close(CLOSE_UNAUTHORIZED)
+        upload_id, separator, payload = data.partition(b"\n")
+        upload_id = upload_id.decode("utf-8", "replace")
+        if not separator:
+            return await self.send_json({"type": "error", "error": "Binary frames must start with '<id>\\n'"})
+        if self.token_expired():
+            return await self.send_json({
+                "type": "error", "id": upload_id, "code": "token_expired", "error": "Token expired, authenticate again.",
+            })
+        upload = self.uploads.get(upload_id)
+        if upload is None and len(self.uploads) >= self.config["MAX_PENDING_UPLOADS"]:
+            return await self.send_json({"type": "error", "id": upload_id, "error": "Too many pending uploads"})
+        size = len(upload or b"") + len(payload)
+        if size > self.config["MAX_UPLOAD_BYTES"] or self.pending_bytes + len(payload) > self.config["MAX_PENDING_BYTES"]:
+            self.drop_upload(upload_id)
+            return await self.send_json({"type": "error", "id": upload_id, "error": "Upload too large"})
+        if upload is None:
+            upload = self.uploads[upload_id] = bytearray()
+        upload.extend(payload)
+        self.pending_bytes += len(payload)
+
+    def drop_upload(self, upload_id):
+        """Remove and return the pending upload `upload_id` as bytes, or None."""
+        if upload_id is None:
+            return None
+        data = self.uploads.pop(str(upload_id), None)
+        if data is None:
+            return None
+        self.pending_bytes -= len(data)
+        return bytes(data)
+
+    async def on_text(self, text):
+        try:
+            message = json.loads(text)
+            kind = message["type"]
+        except (ValueError, KeyError, TypeError):
+            return await self.send_json({"type": "error", "error": "Frames must be JSON objects with a 'type'"})
+
+        if kind == "ping":
+            return await self.send_json({"type": "pong"})
+        if kind == "auth":
+            return await self.authenticate(message.get("token"))
+        if self.user is None:
+            await self.send_json({"type": "error", "error": "Authenticate first"})
+            return await self.close(CLOSE_UNAUTHORIZED)
+
+        request_id = str(message.get("id", ""))
+        if kind == "cancel":
+            request = self.requests.get(request_id)
+            if request is not None:
+                request.cancelled = True
+            self.drop_upload(request_id)
+            return
+        if self.token_expired():
+            return await self.send_json({
+                "type": "error", "id": request_id, "code": "token_expired", "error": "Token expired, authenticate again.",
+            })
+        handler = {"transcribe": self.transcribe_events, "voice_chat": self.voice_chat_events,
+                   "chat": self.chat_events}.get(kind)
+        if handler is None:
+            return await self.send_json({"type": "error", "id": request_id, "error": f"Unknown type '{kind}'"})
+        if not request_id or request_id in self.requests:
+            return await self.send_json({"type": "error", "id": request_id, "error": "Each request needs a new 'id'"})
+        if len(self.requests) >= self.config["MAX_REQUESTS"]:
+            return await self.send_json({"type": "error", "id": request_id, "error": "Too many requests in flight"})
+
+        request = SocketRequest(request_id, self.drop_upload(request_id), self.drop_upload(message.get("image_id")))
+        self.requests[request_id] = request
+        await self.send_json({"type": "accepted", "id": request_id})
+        threading.Thread(
+            target=self.pump, args=(request, handler, message), name=f"glasses-socket-{request_id}", daemon=True
+        ).start()
+
+    async def authenticate(self, token):
+        from users.authentication import CachedJWTAuthentication
+
+        def resolve():
+            auth = CachedJWTAuthentication()
+            try:
+                validated = auth.get_validated_token(token)
+                return auth.get_user(validated), validated["exp"]
+            finally:
+                close_old_connections()
+
+        try:
+            user, expires_at = await sync_to_async(resolve, thread_sensitive=False)()
+        except Exception as e:
+            logger.info(f"Glasses socket authentication failed: {str(e)}")
+            await self.send_json({"type": "error", "error": "Invalid or expired token."})
+            return await self.close(CLOSE_UNAUTHORIZED)
+        if self.user is not None and user.pk != self.user.pk:
+            # Re-auth refreshes the token; switching users needs a new connection
+            await self.send_json({"type": "error", "error": "Token is for a different user."})
+            return await self.close(CLOSE_UNAUTHORIZED)
+        self.user = user
+        self.token_expires_at = expires_at
+        await self.send_json({"type": "ready", "user": user.username, "expires_at": expires_at})
+
+    def pump(self, request, handler, message):
+        """Run one request's event generator on this worker thread and send its events."""
+        events = None
+        # Not replayed, only counted, so a user's streams are capped across connections
+        stream = create_stream(self.user) if message["type"] in STREAMING_TYPES else None
+        try:
+            events = handler(request, message)
+            for event in events:
+                self.send_from_thread(dict(event, id=request.id))
+                reason = "cancelled" if request.cancelled else stream and stream.cancelled
+                # Past "complete" only the history save is left; let it run
+                if reason and event.get("type") != "complete":
+                    # Closing the generator cancels the upstream request, as for SSE
+                    events.close()
+                    self.send_from_thread({"type": "cancelled", "id": request.id, "reason": reason})
+                    break
+        except ValueError as e:
+            self.send_from_thread({"type": "error", "id": request.id, "error": str(e)})
+        except Exception as e:
+            logger.error(f"Error in glasses socket request {request.id}: {str(e)}")
+            self.send_from_thread({"type": "error", "id": request.id, "error": f"Server error: {str(e)}"})
+        finally:
+            if stream is not None:
+                finish_stream(stream)
+            close_old_connections()
+            try:
+                self.loop.call_soon_threadsafe(self.requests.pop, request.id, None)
+            except RuntimeError:
+                # The connection's event loop is gone along with the connection
+                pass
+
+    def get_conversation(self, conversation_id):
+        from .models import Conversation
+
+        if not conversation_id:
+            return None
+        conversation = Conversation.objects.filter(pk=conversation_id, user=self.user).first()
+        if conversation is None:
+            raise ValueError("Conversation not found or access denied.")
+        return conversation
+
+    def audio_upload(self, request):
+        """(temp files, path, format, sha256) for the audio uploaded with `request`."""
+        from .audio import AUDIO_SUFFIXES, HashingChunks, detect_audio_format
+        from .tempfiles import RequestTempFiles
+
+        data = request.audio
+        if not data:
+            raise ValueError("No audio uploaded for this request")
+        audio_format = detect_audio_format(data[:16])
+        if audio_format is None:
+            raise ValueError("Unsupported audio format. Send WAV, Ogg (Opus/Vorbis), FLAC or WebM.")
+        temp_files = RequestTempFiles()
+        chunks = HashingChunks([data])
+        temp_path = temp_files.create(suffix=AUDIO_SUFFIXES[audio_format], chunks=chunks)
+        return temp_files, temp_path, audio_format, chunks.hexdigest()
+
+    def image_upload(self, request):
+        return ContentFile(request.image, name=f"{uuid.uuid4().hex}.jpeg") if request.image else None
+
+    def transcribe_events(self, request, message):
+        from .transcription import transcribe_file
+
+        temp_files, temp_path, audio_format, digest = self.audio_upload(request)
+        with temp_files:
+            result = transcribe_file(
+                temp_path, language=message.get("language") or None, audio_format=audio_format, digest=digest
+            )
+        yield {
+            "type": "transcript",
+            "text": result["text"],
+            "model": result["model"],
+            "language": result["language"],
+            "duration": result["duration"],
+            "seconds_saved": result["seconds_saved"],
+            "cached": result["cached"],
+        }
+
+    def voice_chat_events(self, request, message):
+        from .streaming_views import VoiceChatView
+
+        conversation = self.get_conversation(message.get("conversation_id"))
+        image_file = self.image_upload(request)
+        temp_files, temp_path, audio_format, digest = self.audio_upload(request)
+        return VoiceChatView().voice_events(
+            temp_files, temp_path, audio_format, message.get("language") or None, image_file, self.user,
+            conversation, digest=digest,
+        )
+
+    def chat_events(self, request, message):
+        from .streaming_views import StreamingChatBotView
+
+        prompt = message.get("prompt", "")
+        if not prompt:
+            raise ValueError("No prompt provided")
+        conversation = self.get_conversation(message.get("conversation_id"))
+        image_file = self.image_upload(request)
+        return StreamingChatBotView().stream_response_generator(prompt, image_file, self.user, conversation)
+
+
+async def glasses_socket_application(scope, receive, send):
+    """ASGI application for WebSocket connections; anything but the glasses path is refused."""
+    if scope["path"] != settings.GLASSES_SOCKET["PATH"]:
+        await receive()
+        await send({"type": "websocket.close", "code": 4404})
+        return
+    await GlassesSocket(scope, receive, send).run()
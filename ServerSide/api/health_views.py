@@ -0,0 +1,35 @@
+# health_views.py
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import AllowAny
+from rest_framework import status
+from .model_registry import registry
+
+
+class HealthzView(APIView):
+    """Liveness probe: the process is up and serving requests."""
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        return Response({"status": "alive"})
+
+
+class ReadyzView(APIView):
+    """Readiness probe: 200 only once the models this worker serves are loaded."""
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        ready = registry.is_ready()
+        models = registry.status()
+        if ready:
+            state = "ready"
+        elif any(model_state.startswith("failed") for model_state in models.values()):
+            state = "failed"
+        else:
+            state = "loading"
+        return Response(
+            {"status": state, "models": models},
+            status=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE
+        )
@@ -0,0 +1,142 @@
+# job_views.py
+import base64
+import json
+import logging
+import uuid
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.parsers import MultiPartParser, JSONParser, FormParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework import status
+from . import jobs
+from .tempfiles import RequestTempFiles
+from .audio import AUDIO_SUFFIXES, HashingChunks, sniff_upload
+from .transcription import transcribe_file
+from .views import ChatBotView
+from .conversation_views import get_request_conversation
+
+logger = logging.getLogger(__name__)
+
+
+def job_accepted(request, job):
+    """202 response pointing the client at the job's poll and SSE URLs."""
+    data = job.to_dict()
+    data["status_url"] = request.build_absolute_uri(reverse('job-detail', args=[job.id]))
+    data["events_url"] = request.build_absolute_uri(reverse('job-events', args=[job.id]))
+    return Response(data, status=status.HTTP_202_ACCEPTED)
+
+
+class ChatJobView(ChatBotView):
+    """Queue a chat request and return a job id straight away."""
+    permission_classes = [IsAuthenticated]
+    parser_classes = (MultiPartParser, JSONParser, FormParser)
+
+    def post(self, request):
+        conversation = get_request_conversation(request)
+        prompt = request.data.get('prompt', '')
+        if not prompt:
+            return Response({"error": "No prompt provided"}, status=400)
+
+        image_file = None
+        img_base64 = None
+        if 'image' in request.FILES:
+            # Read the upload now, it is gone once this request returns
+            img_bytes = request.FILES['image'].read()
+            img_base64 = base64.b64encode(img_bytes).decode('utf-8')
+            image_file = ContentFile(img_bytes, name=request.FILES['image'].name or f"{uuid.uuid4().hex}.jpeg")
+
+        user = request.user
+
+        def run():
+            return {"response": self._answer(user, prompt, img_base64, image_file, conversation)}
+
+        try:
+            job = jobs.submit(user, "chat", run)
+        except jobs.JobQueueFull as e:
+            return Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return job_accepted(request, job)
+
+
+class TranscribeJobView(APIView):
+    """Queue an audio transcription and return a job id straight away."""
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser, FormParser]
+
+    def post(self, request, format=None):
+        audio_file = request.FILES.get("audio")
+        if not audio_file:
+            return Response({"error": "No audio file provided."}, status=400)
+
+        audio_format = sniff_upload(audio_file)
+        if audio_format is None:
+            return Response(
+                {"error": "Unsupported audio format. Send WAV, Ogg (Opus/Vorbis), FLAC or WebM."},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+
+        language = request.data.get("language") or None
+
+        # The temp file outlives the request; the job releases it when done
+        temp_files = RequestTempFiles()
+        chunks = HashingChunks(audio_file.chunks())
+        temp_path = temp_files.create(suffix=AUDIO_SUFFIXES[audio_format], chunks=chunks)
+
+        def run():
+            with temp_files:
+                result = transcribe_file(
+                    temp_path, language=language, audio_format=audio_format, digest=chunks.hexdigest()
+                )
+            return {
+                "transcription": result["text"],
+                "model": result["model"],
+                "language": result["language"],
+                "duration": result["duration"],
+                "seconds_saved": result["seconds_saved"],
+                "cached": result["cached"],
+            }
+
+        try:
+            job = jobs.submit(request.user, "transcribe", run)
+        except jobs.JobQueueFull as e:
+            temp_files.release()
+            return Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return job_accepted(request, job)
+
+
+class JobDetailView(APIView):
+    """Poll a job's status and, once finished, its result."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        job = jobs.get_job(job_id, request.user)
+        if job is None:
+            return Response({"error": "Job not found or expired."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job.to_dict())
+
+
+class JobEventsView(APIView):
+    """Server-sent events for a job: its current status, then the final result."""
+    permission_classes = [IsAuthenticated]
+
+    def event_generator(self, job):
+        yield f"data: {json.dumps(job.to_dict())}\n\n"
+        if job.done:
+            return
+        while not job.wait(settings.JOBS["HEARTBEAT"]):
+            # SSE comment line keeps proxies from closing an idle connection
+            yield ": keep-alive\n\n"
+        yield f"data: {json.dumps(job.to_dict())}\n\n"
+
+    def get(self, request, job_id):
+        job = jobs.get_job(job_id, request.user)
+        if job is None:
+            return Response({"error": "Job not found or expired."}, status=status.HTTP_404_NOT_FOUND)
+
+        response = StreamingHttpResponse(self.event_generator(job), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
@@ -0,0 +1,105 @@
+# jobs.py
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections
+from .cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, user_id, kind):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.kind = kind
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        data = {"job_id": self.id, "type": self.kind, "status": self.status}
+        if self.status == "done":
+            data["result"] = self.result
+        elif self.status == "failed":
+            data["error"] = self.error
+        return data
+
+
+_store = None
+# Queued and running jobs; they only move to the TTL store once finished
+_active = {}
+_executor = None
+_slots = None
+_init_lock = threading.Lock()
+
+
+def _setup():
+    global _store, _executor, _slots
+    with _init_lock:
+        if _executor is None:
+            config = settings.JOBS
+            _store = TTLCache(maxsize=config["MAX_STORED"], ttl=config["RESULT_TTL"])
+            _executor = ThreadPoolExecutor(max_workers=config["WORKERS"], thread_name_prefix="api-job")
+            _slots = threading.BoundedSemaphore(config["WORKERS"] + config["MAX_QUEUED"])
+
+
+def _run(job, fn):
+    job.status = "running"
+    try:
+        job.result = fn()
+        job.status = "done"
+    except Exception as e:
+        logger.error(f"Error in {job.kind} job {job.id}: {str(e)}")
+        job.error = str(e)
+        job.status = "failed"
+    finally:
+        job.finished_at = time.time()
+        # Results are kept for RESULT_TTL seconds from completion
+        _store.set(job.id, job)
+        _active.pop(job.id, None)
+        job._done.set()
+        _slots.release()
+        close_old_connections()
+
+
+def submit(user, kind, fn):
+    """Run `fn()` on the worker pool and return its Job.
+
+    Raises JobQueueFull when every worker is busy and the queue is full.
+    """
+    if _executor is None:
+        _setup()
+    if not _slots.acquire(blocking=False):
+        raise JobQueueFull("Too many jobs in progress, try again later")
+    job = Job(user.pk, kind)
+    _active[job.id] = job
+    _executor.submit(_run, job, fn)
+    return job
+
+
+def get_job(job_id, user):
+    """Return the user's job with `job_id`, or None if unknown or expired."""
+    if _store is None:
+        return None
+    job = _active.get(job_id) or _store.get(job_id)
+    if job is None or job.user_id != user.pk:
+        return None
+    return job
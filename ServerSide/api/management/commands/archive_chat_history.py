@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from api.archive import archive_old_chats
+
+
+class Command(BaseCommand):
+    help = "Move old ChatHistory rows into the compressed archive table in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None, help="Archive chats older than this many days")
+        parser.add_argument("--batch-size", type=int, default=None, help="Rows moved per transaction")
+        parser.add_argument("--pause", type=float, default=None, help="Seconds to sleep between batches")
+
+    def handle(self, *args, **options):
+        result = archive_old_chats(days=options["days"], batch_size=options["batch_size"], pause=options["pause"])
+        self.stdout.write(
+            f"Archived {result['archived']} chats ({result['text_bytes']} bytes of text stored in "
+            f"{result['stored_bytes']}) in {result['seconds']}s"
+        )
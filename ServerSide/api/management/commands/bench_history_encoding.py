@@ -0,0 +1,71 @@
+import gzip
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.middleware.compression import brotli
+from api.renderers import msgpack
+
+WORDS = (
+    "the a cup table street sign bus stop left right door red green person "
+    "reading glasses menu price coffee tea open closed exit stairs near far"
+).split()
+
+
+def make_history(rows):
+    """A realistic chat-history page as ChatHistorySerializer returns it."""
+    rng = random.Random(42)
+    now = datetime(2025, 6, 30, tzinfo=timezone.utc)
+    history = []
+    for i in range(rows, 0, -1):
+        history.append({
+            "id": i,
+            "prompt": " ".join(rng.choices(WORDS, k=rng.randint(4, 16))) + "?",
+            "image": f"http://api.example.com/media/chat_images/{rng.getrandbits(64):016x}.jpeg" if i % 3 == 0 else None,
+            "response": " ".join(rng.choices(WORDS, k=rng.randint(40, 160))) + ".",
+            "source": "mobile",
+            "timestamp": (now - timedelta(minutes=7 * i)).isoformat().replace("+00:00", "Z"),
+        })
+    return history
+
+
+class Command(BaseCommand):
+    help = "Compare payload size and client decode time of a chat-history page per encoding."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=50, help="Decodes timed per encoding")
+
+    def handle(self, *args, **options):
+        history = make_history(options["rows"])
+        config = settings.API_COMPRESSION
+
+        body_json = json.dumps(history).encode()
+        variants = [("json", body_json, json.loads)]
+        gz = lambda body: gzip.compress(body, compresslevel=config["GZIP_LEVEL"])
+        variants.append(("json+gzip", gz(body_json), lambda b: json.loads(gzip.decompress(b))))
+        if brotli is not None:
+            br = lambda body: brotli.compress(body, quality=config["BROTLI_QUALITY"])
+            variants.append(("json+br", br(body_json), lambda b: json.loads(brotli.decompress(b))))
+        if msgpack is not None:
+            body_mp = msgpack.packb(history, use_bin_type=True)
+            variants.append(("msgpack", body_mp, msgpack.unpackb))
+            variants.append(("msgpack+gzip", gz(body_mp), lambda b: msgpack.unpackb(gzip.decompress(b))))
+            if brotli is not None:
+                variants.append(("msgpack+br", br(body_mp), lambda b: msgpack.unpackb(brotli.decompress(b))))
+        else:
+            self.stdout.write("msgpack not installed, skipping MessagePack variants")
+
+        self.stdout.write(f"{options['rows']} rows, decode time averaged over {options['repeat']} runs")
+        for name, body, decode in variants:
+            assert decode(body) == history
+            started = time.perf_counter()
+            for _ in range(options["repeat"]):
+                decode(body)
+            decode_ms = (time.perf_counter() - started) * 1000 / options["repeat"]
+            self.stdout.write(
+                f"{name:>13}: {len(body) / 1024:8.1f} KiB ({len(body) / len(body_json):6.1%})  decode {decode_ms:6.2f} ms"
+            )
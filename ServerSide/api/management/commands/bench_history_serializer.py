@@ -0,0 +1,50 @@
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import ChatHistory
+from api.serializers import ChatHistorySerializer, chat_history_rows
+from .bench_history_encoding import make_history
+
+
+class Command(BaseCommand):
+    help = "Compare rows/s of ChatHistorySerializer against the values_list() fast path."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=5000)
+        parser.add_argument("--repeat", type=int, default=5, help="Timed runs per serializer (best is reported)")
+
+    def handle(self, *args, **options):
+        # Fixture rows live only inside this transaction and are rolled back afterwards
+        with transaction.atomic():
+            user = User.objects.create(username="bench-history-serializer")
+            ChatHistory.objects.bulk_create([
+                ChatHistory(
+                    user=user,
+                    prompt=row["prompt"],
+                    response=row["response"],
+                    image=f"chat_images/{row['id']:08x}.jpeg" if row["image"] else None,
+                    source=row["source"],
+                )
+                for row in make_history(options["rows"])
+            ], batch_size=500)
+            chats = ChatHistory.objects.filter(user=user).order_by('-timestamp')
+
+            variants = [
+                ("ModelSerializer", lambda: ChatHistorySerializer(chats.all(), many=True).data),
+                ("values_list", lambda: chat_history_rows(chats.all())),
+            ]
+            expected = variants[0][1]()
+            assert variants[1][1]() == expected
+
+            self.stdout.write(f"{len(expected)} rows, best of {options['repeat']} runs (query included)")
+            for name, run in variants:
+                best = min(self._time(run) for _ in range(options["repeat"]))
+                self.stdout.write(f"{name:>16}: {best * 1000:8.1f} ms  {len(expected) / best:10.0f} rows/s")
+            transaction.set_rollback(True)
+
+    def _time(self, run):
+        started = time.perf_counter()
+        run()
+        return time.perf_counter() - started
@@ -0,0 +1,115 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.db import apply_sqlite_pragmas
+
+SCHEMA = """
+CREATE TABLE chathistory (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    prompt TEXT NOT NULL,
+    response TEXT NOT NULL,
+    source VARCHAR(20) NOT NULL,
+    timestamp DATETIME NOT NULL
+);
+CREATE INDEX chathistory_user_id ON chathistory (user_id);
+"""
+
+
+class Command(BaseCommand):
+    help = "Benchmark mixed ChatHistory-style reads/writes on SQLite with default vs tuned PRAGMAs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=float, default=5.0, help="Duration of each run")
+        parser.add_argument("--writers", type=int, default=4)
+        parser.add_argument("--readers", type=int, default=8)
+        parser.add_argument("--users", type=int, default=50)
+
+    def handle(self, *args, **options):
+        runs = [
+            ("default", {}, 5.0),
+            ("tuned", settings.SQLITE_PRAGMAS, settings.DATABASES["default"]["OPTIONS"].get("timeout", 5.0)),
+        ]
+        for label, pragmas, timeout in runs:
+            stats = self._run(pragmas, timeout, options)
+            elapsed = options["seconds"]
+            self.stdout.write(
+                f"{label:>8}: writes {stats['writes'] / elapsed:8.0f}/s  "
+                f"reads {stats['reads'] / elapsed:8.0f}/s  "
+                f"locked errors {stats['locked']}"
+            )
+
+    def _run(self, pragmas, timeout, options):
+        fd, path = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(fd)
+        stats = {"writes": 0, "reads": 0, "locked": 0}
+        stats_lock = threading.Lock()
+        stop = threading.Event()
+
+        def connect():
+            conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+            if pragmas:
+                apply_sqlite_pragmas(conn.cursor(), pragmas)
+            return conn
+
+        setup = connect()
+        setup.executescript(SCHEMA)
+        setup.commit()
+        setup.close()
+
+        def writer(n):
+            conn = connect()
+            count = 0
+            while not stop.is_set():
+                try:
+                    conn.execute(
+                        "INSERT INTO chathistory (user_id, prompt, response, source, timestamp) "
+                        "VALUES (?, ?, ?, 'mobile', datetime('now'))",
+                        (count % options["users"], "What am I looking at?", "A coffee cup on a desk. " * 20),
+                    )
+                    conn.commit()
+                    count += 1
+                except sqlite3.OperationalError:
+                    conn.rollback()
+                    with stats_lock:
+                        stats["locked"] += 1
+            conn.close()
+            with stats_lock:
+                stats["writes"] += count
+
+        def reader(n):
+            conn = connect()
+            count = 0
+            while not stop.is_set():
+                try:
+                    conn.execute(
+                        "SELECT prompt, response FROM chathistory WHERE user_id = ? "
+                        "ORDER BY timestamp DESC LIMIT 10",
+                        (n % options["users"],),
+                    ).fetchall()
+                    count += 1
+                except sqlite3.OperationalError:
+                    with stats_lock:
+                        stats["locked"] += 1
+            conn.close()
+            with stats_lock:
+                stats["reads"] += count
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(options["writers"])]
+        threads += [threading.Thread(target=reader, args=(i,)) for i in range(options["readers"])]
+        for t in threads:
+            t.start()
+        time.sleep(options["seconds"])
+        stop.set()
+        for t in threads:
+            t.join()
+
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        return stats
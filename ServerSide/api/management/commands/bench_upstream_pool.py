@@ -0,0 +1,72 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+
+from api.fake_upstream import start_in_thread
+from api.upstream import pool_from_settings
+
+
+class Command(BaseCommand):
+    help = "Drive the upstream key pool against a local fake upstream with per-key limits."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--keys", type=int, default=3)
+        parser.add_argument("--requests", type=int, default=60)
+        parser.add_argument("--threads", type=int, default=12)
+        parser.add_argument("--concurrency", type=int, default=2, help="Fake upstream in-flight limit per key")
+        parser.add_argument("--rate", type=int, default=5, help="Fake upstream requests per second per key")
+        parser.add_argument("--latency", type=float, default=0.2)
+
+    def handle(self, *args, **options):
+        # Per-429 warnings would drown the summary
+        logging.getLogger("api.upstream").setLevel(logging.ERROR)
+        server, base_url = start_in_thread(
+            concurrency=options["concurrency"], rate=options["rate"], latency=options["latency"]
+        )
+        try:
+            for key_count in sorted({1, options["keys"]}):
+                keys = [f"sk-fake-{index:04d}" for index in range(key_count)]
+                # The pool's per-key limit mirrors what the upstream allows
+                pool = pool_from_settings(keys=keys, base_url=base_url, max_in_flight=options["concurrency"])
+                self._run(pool, server, options)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def _run(self, pool, server, options):
+        limits = server.limits
+        with limits.lock:
+            limits.served.clear()
+            limits.rejected.clear()
+
+        def request(index):
+            if index % 2:
+                return "".join(
+                    chunk.choices[0].delta.content or ""
+                    for chunk in pool.stream(model="fake", messages=[{"role": "user", "content": "hi"}])
+                )
+            response = pool.complete(model="fake", messages=[{"role": "user", "content": "hi"}])
+            return response.choices[0].message.content
+
+        failures = 0
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["threads"]) as executor:
+            futures = [executor.submit(request, index) for index in range(options["requests"])]
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    failures += 1
+                    self.stderr.write(f"request failed: {e}")
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"{len(pool.states)} key(s): {options['requests'] - failures}/{options['requests']} ok in "
+            f"{elapsed:.2f}s ({(options['requests'] - failures) / elapsed:.1f} req/s), "
+            f"upstream 429s {sum(limits.rejected.values())}"
+        )
+        for state in pool.status():
+            self.stdout.write(
+                f"    {state['key']}: {state['requests']} requests, {state['rate_limited']} rate limited"
+            )
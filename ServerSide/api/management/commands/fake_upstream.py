@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from api.fake_upstream import make_server
+
+
+class Command(BaseCommand):
+    help = "Run a local fake OpenRouter endpoint that enforces per-key limits (point OPENROUTER_BASE_URL at it)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--concurrency", type=int, default=2, help="Requests in flight allowed per key")
+        parser.add_argument("--rate", type=int, default=10, help="Requests per second allowed per key")
+        parser.add_argument("--latency", type=float, default=0.5, help="Seconds per completion")
+
+    def handle(self, *args, **options):
+        server = make_server(
+            port=options["port"], concurrency=options["concurrency"],
+            rate=options["rate"], latency=options["latency"],
+        )
+        self.stdout.write(f"Fake upstream on http://127.0.0.1:{options['port']}/v1")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.media_cleanup import sweep_orphaned_images
+
+
+class Command(BaseCommand):
+    help = "Delete chat image files that no ChatHistory row references."
+
+    def handle(self, *args, **options):
+        removed = sweep_orphaned_images()
+        self.stdout.write(f"Removed {removed} orphaned chat images")
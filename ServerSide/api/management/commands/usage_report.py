@@ -0,0 +1,24 @@
+import json
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import ChatHistory
+from api.usage import usage_report
+from api.usage_views import GROUP_BY_FIELDS
+
+
+class Command(BaseCommand):
+    help = "Print token totals and TTFT/duration percentiles for recent chats."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=float, default=7, help="Report on chats from the last N days")
+        parser.add_argument("--group-by", choices=GROUP_BY_FIELDS, default=None)
+        parser.add_argument("--user-id", type=int, default=None)
+
+    def handle(self, *args, **options):
+        chats = ChatHistory.objects.filter(timestamp__gte=timezone.now() - timedelta(days=options["days"]))
+        if options["user_id"] is not None:
+            chats = chats.filter(user_id=options["user_id"])
+        report = usage_report(chats, options["group_by"])
+        self.stdout.write(json.dumps(report, indent=2, default=str))
@@ -0,0 +1,68 @@
+# media_cleanup.py
+import logging
+import queue
+import threading
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from .models import ArchivedChat, ChatHistory
+
+logger = logging.getLogger(__name__)
+
+_pending = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _delete_orphaned(names):
+    """Delete the stored images in `names` that no hot or archived chat still references."""
+    names = set(names)
+    in_use = set(ChatHistory.objects.filter(image__in=names).values_list("image", flat=True))
+    in_use.update(ArchivedChat.objects.filter(image__in=names).values_list("image", flat=True))
+    removed = 0
+    for name in names - in_use:
+        try:
+            default_storage.delete(name)
+            removed += 1
+        except Exception as e:
+            logger.error(f"Error deleting chat image {name}: {str(e)}")
+    return removed
+
+
+def _run():
+    while True:
+        names = [_pending.get()]
+        # Drain whatever else is queued so several deletes share one lookup
+        while True:
+            try:
+                names.append(_pending.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            removed = _delete_orphaned(names)
+            logger.info(f"Removed {removed} orphaned chat images")
+        except Exception as e:
+            logger.error(f"Error in chat image cleanup: {str(e)}")
+        finally:
+            close_old_connections()
+
+
+def schedule_image_cleanup(names):
+    """Queue image files for removal by the background cleanup thread."""
+    global _worker
+    names = [name for name in names if name]
+    if not names:
+        return
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_run, name="chat-image-cleanup", daemon=True)
+            _worker.start()
+    for name in names:
+        _pending.put(name)
+
+
+def sweep_orphaned_images(directory="chat_images"):
+    """Remove files under `directory` in media storage that no chat references."""
+    if not default_storage.exists(directory):
+        return 0
+    _, files = default_storage.listdir(directory)
+    return _delete_orphaned(f"{directory}/{filename}" for filename in files)
@@ -0,0 +1,144 @@
+# media_views.py
+import hashlib
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse
+from django.utils.http import http_date, parse_etags
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from rest_framework import status
+from .models import ArchivedChat, ChatHistory
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def file_etag(name, stat):
+    """Strong validator for a stored image; chat images are never rewritten in place."""
+    digest = hashlib.sha1(f"{name}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single `bytes=` range, None to send the
+    whole file, or "unsatisfiable". Multi-range requests get the whole file.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return "unsatisfiable"
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return "unsatisfiable"
+    return start, end
+
+
+class FileRange:
+    """Read-only view of bytes start..end (inclusive) of an open file."""
+
+    def __init__(self, file, start, end):
+        self.file = file
+        self.file.seek(start)
+        self.remaining = end - start + 1
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+class ChatImageView(APIView):
+    """A chat's image, only for the user who owns the chat.
+
+    With MEDIA_DELIVERY["BACKEND"] set, the transfer is handed to the front
+    proxy (nginx X-Accel-Redirect or Apache/lighttpd X-Sendfile); otherwise
+    a FileResponse streams it, using the server's sendfile when available.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_image_name(self, user, chat_id):
+        for model in (ChatHistory, ArchivedChat):
+            image = model.objects.filter(id=chat_id, user=user).values_list("image", flat=True).first()
+            if image is not None:
+                return image
+        return None
+
+    def get(self, request, chat_id):
+        name = self.get_image_name(request.user, chat_id)
+        if not name:
+            return Response({"error": "Image not found or access denied."}, status=status.HTTP_404_NOT_FOUND)
+        path = default_storage.path(name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return Response({"error": "Image not found or access denied."}, status=status.HTTP_404_NOT_FOUND)
+
+        config = settings.MEDIA_DELIVERY
+        etag = file_etag(name, stat)
+        headers = {
+            "ETag": etag,
+            "Last-Modified": http_date(stat.st_mtime),
+            # Private: the URL is the same for everyone but only the owner may read it
+            "Cache-Control": f"private, max-age={config['MAX_AGE']}, immutable",
+        }
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            return self._with_headers(HttpResponse(status=status.HTTP_304_NOT_MODIFIED), headers)
+
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if config["BACKEND"] == "nginx":
+            response = HttpResponse(content_type=content_type)
+            # nginx decodes the URI before mapping it onto the alias
+            response["X-Accel-Redirect"] = config["ACCEL_PREFIX"].rstrip("/") + "/" + quote(name)
+            return self._with_headers(response, headers)
+        if config["BACKEND"] == "sendfile":
+            response = HttpResponse(content_type=content_type)
+            response["X-Sendfile"] = path
+            return self._with_headers(response, headers)
+
+        return self._with_headers(self.file_response(request, path, stat.st_size, etag, content_type), headers)
+
+    def file_response(self, request, path, size, etag, content_type):
+        byte_range = parse_range(request.headers.get("Range"), size)
+        # A stale If-Range means the client's partial copy is outdated: send it all
+        if_range = request.headers.get("If-Range")
+        if if_range and if_range != etag:
+            byte_range = None
+
+        if byte_range == "unsatisfiable":
+            response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+        if byte_range is None:
+            # A real file object lets the WSGI server use sendfile()
+            response = FileResponse(open(path, "rb"), content_type=content_type)
+        else:
+            start, end = byte_range
+            response = FileResponse(
+                FileRange(open(path, "rb"), start, end), content_type=content_type,
+                status=status.HTTP_206_PARTIAL_CONTENT,
+            )
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+            response["Content-Length"] = str(end - start + 1)
+        response["Accept-Ranges"] = "bytes"
+        return response
+
+    def _with_headers(self, response, headers):
+        for header, value in headers.items():
+            response[header] = value
+        return response
@@ -0,0 +1,82 @@
+import gzip
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+_accept_encoding_re = re.compile(r"\s*([^\s;,]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?")
+
+
+def parse_accept_encoding(header):
+    """Return {coding: q} from an Accept-Encoding header."""
+    codings = {}
+    for part in header.split(","):
+        match = _accept_encoding_re.match(part)
+        if not match or not match.group(1):
+            continue
+        try:
+            codings[match.group(1).lower()] = float(match.group(2)) if match.group(2) else 1.0
+        except ValueError:
+            continue
+    return codings
+
+
+def choose_encoding(header):
+    """Pick br or gzip from an Accept-Encoding header, preferring br on a tie."""
+    codings = parse_accept_encoding(header)
+    wildcard = codings.get("*", 0.0)
+    candidates = []
+    if brotli is not None:
+        candidates.append(("br", codings.get("br", wildcard)))
+    candidates.append(("gzip", codings.get("gzip", wildcard)))
+    encoding, q = max(candidates, key=lambda c: c[1])
+    return encoding if q > 0 else None
+
+
+class CompressionMiddleware:
+    """Compresses large API bodies with brotli or gzip, whichever the client prefers.
+
+    Only non-streaming responses whose content type is listed in
+    API_COMPRESSION["CONTENT_TYPES"] and whose body is at least
+    API_COMPRESSION["MIN_SIZE"] bytes are compressed, so SSE streams are
+    never buffered.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        config = settings.API_COMPRESSION
+
+        content_type = response.get("Content-Type", "").split(";")[0].strip()
+        if content_type not in config["CONTENT_TYPES"]:
+            return response
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        if response.streaming or response.has_header("Content-Encoding"):
+            return response
+        if len(response.content) < config["MIN_SIZE"]:
+            return response
+
+        encoding = choose_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding == "br":
+            compressed = brotli.compress(response.content, quality=config["BROTLI_QUALITY"])
+        elif encoding == "gzip":
+            compressed = gzip.compress(response.content, compresslevel=config["GZIP_LEVEL"], mtime=0)
+        else:
+            return response
+
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = encoding
+        if response.has_header("ETag"):
+            response["ETag"] = response["ETag"].rstrip('"') + f'-{encoding}"'
+        return response
@@ -0,0 +1,81 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('django.request')
+
+IN_LIST_RE = re.compile(r"\bIN \((?:%s, )*%s\)")
+NUMBER_RE = re.compile(r"\b\d+\b")
+
+
+def query_shape(sql):
+    """SQL with its variable parts collapsed, so repeats of one query compare equal."""
+    return NUMBER_RE.sub("N", IN_LIST_RE.sub("IN (...)", sql))
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest = (0.0, "")
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            if elapsed > self.slowest[0]:
+                self.slowest = (elapsed, sql)
+            self.shapes[query_shape(sql)] += 1
+
+    def repeated(self, threshold):
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+class QueryInspectorMiddleware:
+    """Opt-in per-request ORM instrumentation, written to the access log.
+
+    Records query count, total DB time and the slowest statement, and flags
+    any query shape run QUERY_INSPECTOR["N_PLUS_ONE_THRESHOLD"] or more
+    times as a likely N+1. The count and DB time also go out as the
+    X-Query-Count and X-DB-Time-Ms response headers, for load tests.
+    Streaming bodies are produced after the summary is written, so their
+    queries aren't counted.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSPECTOR["ENABLED"]:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = settings.QUERY_INSPECTOR
+        stats = QueryStats()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+
+        repeated = stats.repeated(config["N_PLUS_ONE_THRESHOLD"])
+        slowest_seconds, slowest_sql = stats.slowest
+        summary = (
+            f"{request.method} {request.path_info} {response.status_code} "
+            f"queries={stats.count} db={stats.seconds * 1000:.1f}ms slowest={slowest_seconds * 1000:.1f}ms"
+        )
+        if slowest_seconds * 1000 >= config["SLOW_MS"]:
+            summary += f" slow_sql=\"{slowest_sql[:config['SQL_PREVIEW']]}\""
+        for shape, count in repeated:
+            summary += f" n+1={count}x\"{shape[:config['SQL_PREVIEW']]}\""
+        logger.log(logging.WARNING if repeated else logging.INFO, summary)
+        response['X-Query-Count'] = str(stats.count)
+        response['X-DB-Time-Ms'] = f"{stats.seconds * 1000:.1f}"
+        return response
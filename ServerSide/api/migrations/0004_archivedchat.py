@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_conversation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedChat',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('codec', models.CharField(max_length=8)),
+                ('prompt_data', models.BinaryField()),
+                ('response_data', models.BinaryField()),
+                ('image', models.ImageField(blank=True, null=True, upload_to='chat_images/')),
+                ('source', models.CharField(default='unknown', max_length=20)),
+                ('timestamp', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('conversation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_messages', to='api.conversation')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_chats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-timestamp'], name='archivedchat_user_recent')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_archivedchat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedchat',
+            name='truncated',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='chathistory',
+            name='truncated',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,109 @@
+# model_registry.py
+import logging
+import threading
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """Heavy models by name, loaded on a background thread or on first use.
+
+    Loaders are plain callables registered up front, so importing this
+    module (and anything that registers with it) never imports torch,
+    whisper or the model weights themselves.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._errors = {}
+        self._loading = set()
+        self._lock = threading.Lock()
+        self._name_locks = {}
+        self._preload_done = threading.Event()
+        self._lazy = False
+        self._thread = None
+
+    def register(self, name, loader):
+        with self._lock:
+            self._loaders.setdefault(name, loader)
+            self._name_locks.setdefault(name, threading.Lock())
+
+    def get(self, name):
+        """Return the model, loading it now if the background thread hasn't yet."""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model '{name}'")
+
+        with self._name_locks[name]:
+            model = self._models.get(name)
+            if model is None:
+                self._loading.add(name)
+                try:
+                    logger.info(f"Loading model '{name}'")
+                    model = self._loaders[name]()
+                    self._models[name] = model
+                    self._errors.pop(name, None)
+                except Exception as e:
+                    self._errors[name] = str(e)
+                    raise
+                finally:
+                    self._loading.discard(name)
+        return model
+
+    def load_all(self):
+        for name in list(self._loaders):
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.error(f"Error loading model '{name}': {str(e)}")
+        self._preload_done.set()
+
+    def start_background_loading(self):
+        """Load every registered model on a daemon thread (once per process)."""
+        with self._lock:
+            if self._thread is not None:
+                return self._thread
+            self._thread = threading.Thread(target=self.load_all, name="model-loader", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def load_lazily(self):
+        """Skip preloading; models load on first use and readiness doesn't wait for them."""
+        self._lazy = True
+
+    def is_ready(self):
+        """True once the background pass has finished with every model loaded."""
+        if self._lazy:
+            return True
+        return self._preload_done.is_set() and all(name in self._models for name in self._loaders)
+
+    def status(self):
+        states = {}
+        for name in self._loaders:
+            if name in self._models:
+                states[name] = "loaded"
+            elif name in self._loading:
+                states[name] = "loading"
+            elif name in self._errors:
+                states[name] = f"failed: {self._errors[name]}"
+            else:
+                states[name] = "pending"
+        return states
+
+
+registry = ModelRegistry()
+
+
+def start_model_loading():
+    """Called by the WSGI/ASGI entry points so only serving processes load models."""
+    from .transcription import register_whisper_models
+
+    register_whisper_models()
+    if settings.MODEL_REGISTRY["PRELOAD"]:
+        registry.start_background_loading()
+    else:
+        registry.load_lazily()
@@ -1,13 +1,141 @@
 from django.db import models
+from django.db.models import F
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+PREVIEW_LENGTH = 120
+
+# Per-message usage, recorded by api.usage.UsageMeter and copied on archival
+USAGE_FIELDS = ("model", "prompt_tokens", "completion_tokens", "ttft_ms", "duration_ms", "has_image")
+
+
+class ConversationManager(models.Manager):
+    def record_messages(self, conversation_id, chats):
+        """Fold newly saved `chats` into the conversation's denormalized summary."""
+        if conversation_id is None or not chats:
+            return
+        latest = max(chats, key=lambda chat: chat.timestamp)
+        self.filter(pk=conversation_id).update(
+            last_message_at=latest.timestamp,
+            message_count=F("message_count") + len(chats),
+            preview=latest.prompt[:PREVIEW_LENGTH],
+        )
+
+    def refresh_summaries(self, conversation_ids):
+        """Recompute count, last message time and preview over live and
+        archived messages, e.g. after deletes.
+        """
+        conversation_ids = [pk for pk in set(conversation_ids) if pk is not None]
+        for conversation in self.filter(pk__in=conversation_ids).only("pk", "created_at"):
+            live = ChatHistory.objects.filter(conversation=conversation.pk)
+            archived = ArchivedChat.objects.filter(conversation=conversation.pk)
+            latest = [
+                chat for chat in (
+                    live.order_by("-timestamp").only("timestamp", "prompt").first(),
+                    archived.order_by("-timestamp").only("timestamp", "codec", "prompt_data").first(),
+                )
+                if chat is not None
+            ]
+            latest = max(latest, key=lambda chat: chat.timestamp, default=None)
+            self.filter(pk=conversation.pk).update(
+                message_count=live.count() + archived.count(),
+                last_message_at=latest.timestamp if latest else conversation.created_at,
+                preview=latest.prompt[:PREVIEW_LENGTH] if latest else "",
+            )
+
+
+class Conversation(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="conversations")
+    title = models.CharField(max_length=200, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Denormalized from ChatHistory so listing conversations never touches messages
+    last_message_at = models.DateTimeField(default=timezone.now)
+    message_count = models.PositiveIntegerField(default=0)
+    preview = models.CharField(max_length=PREVIEW_LENGTH, blank=True, default="")
+
+    objects = ConversationManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-last_message_at"], name="conversation_user_recent"),
+        ]
+
+    def __str__(self):
+        return self.title or f"Conversation {self.pk}"
+
 
 class ChatHistory(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
+    conversation = models.ForeignKey(
+        Conversation, on_delete=models.SET_NULL, null=True, blank=True, related_name="messages"
+    )
     prompt = models.TextField()
     image = models.ImageField(upload_to='chat_images/', blank=True, null=True)
     response = models.TextField()
     source = models.CharField(max_length=20, default="unknown")  # e.g., 'desktop' or 'mobile'
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Streamed answer cut short because the client went away
+    truncated = models.BooleanField(default=False)
+    # Upstream usage (api/usage.py); null where the upstream didn't report it
+    model = models.CharField(max_length=100, blank=True, default="")
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True)
+    completion_tokens = models.PositiveIntegerField(null=True, blank=True)
+    ttft_ms = models.PositiveIntegerField(null=True, blank=True)
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+    has_image = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-timestamp"], name="chathistory_user_recent"),
+            models.Index(fields=["conversation", "-timestamp"], name="chathistory_conv_recent"),
+            # Usage reports: time-window scans, overall and per model
+            models.Index(fields=["timestamp"], name="chathistory_time"),
+            models.Index(fields=["model", "timestamp"], name="chathistory_model_time"),
+        ]
 
     def __str__(self):
         return f"{self.source} - {self.prompt[:30]}..."
+
+
+class ArchivedChat(models.Model):
+    """A ChatHistory row moved out of the hot table by api.archive, text compressed.
+
+    Keeps the original row id so clients see the same ids before and after archival.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_chats")
+    conversation = models.ForeignKey(
+        Conversation, on_delete=models.SET_NULL, null=True, blank=True, related_name="archived_messages"
+    )
+    codec = models.CharField(max_length=8)
+    prompt_data = models.BinaryField()
+    response_data = models.BinaryField()
+    image = models.ImageField(upload_to='chat_images/', blank=True, null=True)
+    source = models.CharField(max_length=20, default="unknown")
+    timestamp = models.DateTimeField()
+    truncated = models.BooleanField(default=False)
+    model = models.CharField(max_length=100, blank=True, default="")
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True)
+    completion_tokens = models.PositiveIntegerField(null=True, blank=True)
+    ttft_ms = models.PositiveIntegerField(null=True, blank=True)
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+    has_image = models.BooleanField(default=False)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-timestamp"], name="archivedchat_user_recent"),
+        ]
+
+    @property
+    def prompt(self):
+        from .archive import decompress_text
+        return decompress_text(self.codec, self.prompt_data)
+
+    @property
+    def response(self):
+        from .archive import decompress_text
+        return decompress_text(self.codec, self.response_data)
+
+    def __str__(self):
+        return f"{self.source} - archived chat {self.pk}"
@@ -0,0 +1,23 @@
+# renderers.py
+from rest_framework.renderers import BaseRenderer
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Renders responses as MessagePack for clients sending `Accept: application/msgpack`.
+
+    Needs the msgpack package; settings only register it when that is installed.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, use_bin_type=True, default=str)
@@ -1,8 +1,94 @@
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
 from rest_framework import serializers
-from .models import ChatHistory
+from .models import ArchivedChat, ChatHistory, Conversation
+
+
+def chat_image_url(chat_id, request=None):
+    """URL of a chat's image behind the owner check (api.media_views.ChatImageView)."""
+    url = reverse('chat-image', args=[chat_id])
+    return request.build_absolute_uri(url) if request is not None else url
 
 
 class ChatHistorySerializer(serializers.ModelSerializer):
+    image = serializers.SerializerMethodField()
+
+    def get_image(self, chat):
+        return chat_image_url(chat.pk, self.context.get('request')) if chat.image else None
+
     class Meta:
         model = ChatHistory
-        fields = ['id', 'prompt', 'image', 'response', 'source', 'timestamp']
+        fields = ['id', 'conversation', 'prompt', 'image', 'response', 'source', 'timestamp', 'truncated']
+
+
+def _format_datetime(value, tz):
+    # Same output as DRF's DateTimeField with the default ISO 8601 format
+    if value is None:
+        return None
+    if tz is not None:
+        value = value.astimezone(tz)
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def chat_history_rows(queryset, request=None):
+    """Read-only fast path for ChatHistorySerializer(queryset, many=True).data.
+
+    Projects the queryset with values_list() and turns each tuple into the
+    serializer's dict directly, skipping model instances and per-field
+    to_representation(). The output is identical, field for field.
+    """
+    tz = timezone.get_current_timezone() if settings.USE_TZ else None
+
+    def to_dict(row):
+        pk, conversation_id, prompt, image, response, source, timestamp, truncated = row
+        return {
+            'id': pk,
+            'conversation': conversation_id,
+            'prompt': prompt,
+            'image': chat_image_url(pk, request) if image else None,
+            'response': response,
+            'source': source,
+            'timestamp': _format_datetime(timestamp, tz),
+            'truncated': truncated,
+        }
+
+    rows = queryset.values_list(
+        'id', 'conversation_id', 'prompt', 'image', 'response', 'source', 'timestamp', 'truncated'
+    )
+    return [to_dict(row) for row in rows]
+
+
+class ArchivedChatSerializer(serializers.ModelSerializer):
+    prompt = serializers.CharField(read_only=True)
+    image = serializers.SerializerMethodField()
+    response = serializers.CharField(read_only=True)
+    archived = serializers.BooleanField(default=True, read_only=True)
+
+    def get_image(self, chat):
+        return chat_image_url(chat.pk, self.context.get('request')) if chat.image else None
+
+    class Meta:
+        model = ArchivedChat
+        fields = ['id', 'conversation', 'prompt', 'image', 'response', 'source', 'timestamp', 'truncated', 'archived']
+
+
+class ConversationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Conversation
+        fields = ['id', 'title', 'created_at', 'last_message_at', 'message_count', 'preview']
+        read_only_fields = ['created_at', 'last_message_at', 'message_count', 'preview']
+
+
+class BulkDeleteChatSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False, max_length=1000)
+    after = serializers.DateTimeField(required=False)
+    before = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        if not data.get("ids") and "after" not in data and "before" not in data:
+            raise serializers.ValidationError("Provide 'ids' or an 'after'/'before' time range.")
+        return data
@@ -0,0 +1,157 @@
+# sse_replay.py
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from django.conf import settings
+from .cache import TTLCache
+
+
+class ReplayWindowExceeded(Exception):
+    """The events after the client's Last-Event-ID are no longer buffered."""
+
+
+class StreamBuffer:
+    """Events of one SSE stream, numbered from 0, with the most recent kept for replay."""
+
+    def __init__(self, user_id, max_events):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.events = deque(maxlen=max_events)
+        self.next_seq = 0
+        self.closed = False
+        self.cancelled = None
+        # Clients currently reading the stream; generation stops once none
+        # have been attached for the disconnect grace period
+        self.followers = 0
+        self.detached_at = time.monotonic()
+        self._cond = threading.Condition()
+
+    def append(self, data):
+        with self._cond:
+            seq = self.next_seq
+            self.events.append((seq, data))
+            self.next_seq += 1
+            self._cond.notify_all()
+        return seq
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def attach(self):
+        with self._cond:
+            self.followers += 1
+
+    def detach(self):
+        with self._cond:
+            self.followers -= 1
+            if not self.followers:
+                self.detached_at = time.monotonic()
+
+    def cancel(self, reason):
+        """Ask the generating thread to stop; it checks between events."""
+        with self._cond:
+            self.cancelled = self.cancelled or reason
+
+    def stop_reason(self, grace):
+        """Why generation should stop now, or None to keep going."""
+        with self._cond:
+            if self.cancelled:
+                return self.cancelled
+            if not self.followers and time.monotonic() - self.detached_at > grace:
+                return "disconnected"
+        return None
+
+    def follow(self, last_seq=-1, heartbeat=15):
+        """Yield (seq, data) for every event after `last_seq`, waiting for new
+        ones until the stream closes. Yields (None, None) after `heartbeat`
+        idle seconds so the caller can send a keep-alive.
+        """
+        next_seq = last_seq + 1
+        while True:
+            with self._cond:
+                if self.events and next_seq < self.events[0][0]:
+                    raise ReplayWindowExceeded()
+                pending = [event for event in self.events if event[0] >= next_seq]
+                if not pending:
+                    if self.closed:
+                        return
+                    if not self._cond.wait(heartbeat):
+                        pending = [(None, None)]
+            for seq, data in pending:
+                if seq is not None:
+                    next_seq = seq + 1
+                yield seq, data
+
+
+_streams = None
+_streams_lock = threading.Lock()
+_user_streams = {}
+_user_streams_lock = threading.Lock()
+
+
+def _registry():
+    global _streams
+    if _streams is None:
+        with _streams_lock:
+            if _streams is None:
+                config = settings.SSE_REPLAY
+                _streams = TTLCache(maxsize=config["MAX_STREAMS"], ttl=config["TTL"])
+    return _streams
+
+
+def create_stream(user):
+    """A new stream for `user`, cancelling their oldest running streams beyond
+    SSE_REPLAY["MAX_ACTIVE_PER_USER"].
+    """
+    config = settings.SSE_REPLAY
+    buffer = StreamBuffer(user.pk, config["MAX_EVENTS"])
+    with _user_streams_lock:
+        active = [stream for stream in _user_streams.get(user.pk, []) if not stream.closed]
+        while active and len(active) >= config["MAX_ACTIVE_PER_USER"]:
+            active.pop(0).cancel("superseded")
+        active.append(buffer)
+        _user_streams[user.pk] = active
+    _registry().set(buffer.id, buffer)
+    return buffer
+
+
+def finish_stream(buffer):
+    """Close `buffer` and stop counting it against its user's active streams.
+    It stays replayable until its TTL runs out.
+    """
+    buffer.close()
+    with _user_streams_lock:
+        active = [stream for stream in _user_streams.get(buffer.user_id, []) if stream is not buffer]
+        if active:
+            _user_streams[buffer.user_id] = active
+        else:
+            _user_streams.pop(buffer.user_id, None)
+
+
+def touch_stream(buffer):
+    """Restart the stream's TTL; called as events arrive."""
+    _registry().set(buffer.id, buffer)
+
+
+def get_stream(stream_id, user):
+    buffer = _registry().get(stream_id)
+    if buffer is None or buffer.user_id != user.pk:
+        return None
+    return buffer
+
+
+def parse_last_event_id(value):
+    """Split a `<stream_id>:<seq>` Last-Event-ID into (stream_id, seq)."""
+    stream_id, _, seq = (value or "").strip().rpartition(":")
+    try:
+        return stream_id, int(seq)
+    except ValueError:
+        return None, None
+
+
+def format_event(stream_id, seq, data):
+    return f"id: {stream_id}:{seq}\ndata: {json.dumps(data)}\n\n"
@@ -1,40 +1,45 @@
 # streaming_views.py
 import json
 import logging
+import threading
 import time
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
 from django.http import StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, JSONParser, FormParser
-from .models import ChatHistory
-import openai
+from .models import ChatHistory, Conversation
+from .conversation_views import get_request_conversation
 from django.conf import settings
 from dotenv import load_dotenv
 import base64
-from PIL import Image
 import io
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import permission_classes
+from .audio import AUDIO_SUFFIXES, HashingChunks, sniff_upload
+from .tempfiles import RequestTempFiles
+from .transcription import strip_control_words, transcribe_file
+from .upstream import get_pool
+from .usage import UsageMeter
+from .sse_replay import (
+    ReplayWindowExceeded, create_stream, finish_stream, format_event, get_stream, parse_last_event_id, touch_stream,
+)
 logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
-# Configure API keys
-openrouter_api_key = settings.OPENROUTER_API_KEY
-
-DEFAULT_HTTP_HEADERS = {
-    "HTTP-Referer": "https://eyeconic-chat.example",
-    "X-Title": "Eyeconic Chat App",
-}
-
 class StreamingChatBotView(APIView):
     parser_classes = (MultiPartParser, JSONParser, FormParser)
     permission_classes = [IsAuthenticated]  # ✅ ADDED: Ensure user is authenticated to access this view
 
-    def _get_relevant_history(self, user):  # ✅ ADDED: Accept user to filter chats
-        """Get last 10 user-specific interactions to maintain context."""
-        history = ChatHistory.objects.filter(user=user).order_by('-timestamp')[:10]  # ✅ MODIFIED: Only fetch user's chats
+    def _get_relevant_history(self, user, conversation=None):  # ✅ ADDED: Accept user to filter chats
+        """Get last 10 user-specific (or conversation-specific) interactions to maintain context."""
+        if conversation is not None:
+            history = ChatHistory.objects.filter(conversation=conversation).order_by('-timestamp')[:10]
+        else:
+            history = ChatHistory.objects.filter(user=user).order_by('-timestamp')[:10]  # ✅ MODIFIED: Only fetch user's chats
         context = []
         for chat in reversed(history):  # Reverse to get chronological order
             context.append(f"User: {chat.prompt}")
@@ -43,6 +48,8 @@ class StreamingChatBotView(APIView):
 
     def prepare_image(self, image_data):
         """Convert image data to base64 for AI processing."""
+        from PIL import Image
+
         try:
             image = Image.open(io.BytesIO(image_data)).convert("RGB")
             buffered = io.BytesIO()
@@ -52,16 +59,9 @@ class StreamingChatBotView(APIView):
             logger.error(f"Error preparing image: {str(e)}")
             raise ValueError(f"Error processing image: {str(e)}")
 
-    def stream_response_generator(self, prompt, image_file=None, user=None):  # ✅ ADDED user param
-        """Generator function that yields streaming response chunks."""
+    def stream_response_generator(self, prompt, image_file=None, user=None, conversation=None):  # ✅ ADDED user param
+        """Generator function that yields streaming response events as dicts."""
         try:
-            # Set up OpenAI client for streaming
-            session = openai.Client(
-                api_key=openrouter_api_key,
-                base_url="https://openrouter.ai/api/v1",
-                default_headers=DEFAULT_HTTP_HEADERS
-            )
-
             img_base64 = None
 
             # Handle image upload if present
@@ -72,11 +72,11 @@ class StreamingChatBotView(APIView):
                     image_file.seek(0)  # Reset file pointer for later use
                 except Exception as e:
                     logger.error(f"Error processing image: {str(e)}")
-                    yield f"data: {json.dumps({'error': f'Error processing image: {str(e)}'})}\n\n"
+                    yield {'type': 'error', 'error': f'Error processing image: {str(e)}'}
                     return
 
             # ✅ MODIFIED: Pass user to history method
-            chat_history = self._get_relevant_history(user)
+            chat_history = self._get_relevant_history(user, conversation)
 
             # System and user messages
             system_message = {
@@ -113,51 +113,164 @@ Important instructions:
                     "content": prompt
                 }
 
-            yield f"data: {json.dumps({'type': 'connection', 'status': 'connected'})}\n\n"
+            yield {'type': 'connection', 'status': 'connected'}
 
-            response_stream = session.chat.completions.create(
-                model="opengvlab/internvl3-14b:free",
+            # Holds an upstream key from the pool until the stream is consumed
+            model = "opengvlab/internvl3-14b:free"
+            meter = UsageMeter(has_image=bool(img_base64))
+            response_stream = get_pool().stream(
+                model=model,
                 messages=[system_message, user_message],
-                stream=True,
                 temperature=0.7,
-                max_tokens=2048
+                max_tokens=2048,
+                # Token counts arrive in a final chunk with no choices
+                stream_options={"include_usage": True},
             )
 
             complete_response = ""
 
-            for chunk in response_stream:
-                if chunk.choices[0].delta.content is not None:
-                    content_chunk = chunk.choices[0].delta.content
-                    complete_response += content_chunk
-                    chunk_data = {
-                        'type': 'content',
-                        'content': content_chunk,
-                        'complete': False
-                    }
-                    yield f"data: {json.dumps(chunk_data)}\n\n"
+            try:
+                for chunk in response_stream:
+                    meter.record(chunk, model)
+                    if chunk.choices and chunk.choices[0].delta.content is not None:
+                        meter.first_token()
+                        content_chunk = chunk.choices[0].delta.content
+                        complete_response += content_chunk
+                        chunk_data = {
+                            'type': 'content',
+                            'content': content_chunk,
+                            'complete': False
+                        }
+                        yield chunk_data
+            except GeneratorExit:
+                # Cancelled (client gone or stream superseded): stop the upstream
+                # generating tokens nobody will read, and keep what we have
+                response_stream.close()
+                try:
+                    self._save_chat(user, conversation, prompt, image_file, complete_response, meter, truncated=True)
+                except Exception as e:
+                    logger.error(f"Error saving truncated chat to history: {str(e)}")
+                raise
 
-            yield f"data: {json.dumps({'type': 'complete', 'complete': True})}\n\n"
+            meter.finish()
+            yield {'type': 'complete', 'complete': True}
 
             # ✅ ADDED user to saved chat
             try:
-                ChatHistory.objects.create(
-                    user=user,  # ✅ associate with the current user
-                    prompt=prompt,
-                    image=image_file if image_file else None,
-                    response=complete_response,
-                    source="mobile"
-                )
-                logger.info(f"Saved streaming chat to history: {len(complete_response)} chars")
+                self._save_chat(user, conversation, prompt, image_file, complete_response, meter)
             except Exception as e:
                 logger.error(f"Error saving to chat history: {str(e)}")
-                yield f"data: {json.dumps({'type': 'error', 'error': 'Failed to save chat history'})}\n\n"
+                yield {'type': 'error', 'error': 'Failed to save chat history'}
 
         except Exception as e:
             logger.error(f"Error in streaming response: {str(e)}")
-            yield f"data: {json.dumps({'type': 'error', 'error': f'Server error: {str(e)}'})}\n\n"
+            yield {'type': 'error', 'error': f'Server error: {str(e)}'}
 
-    def post(self, request):
+    def _save_chat(self, user, conversation, prompt, image_file, response, meter, truncated=False):
+        chat = ChatHistory.objects.create(
+            user=user,  # ✅ associate with the current user
+            conversation=conversation,
+            prompt=prompt,
+            image=image_file if image_file else None,
+            response=response,
+            source="mobile",
+            truncated=truncated,
+            **meter.fields()
+        )
+        if conversation is not None:
+            Conversation.objects.record_messages(conversation.pk, [chat])
+        logger.info(f"Saved streaming chat to history: {len(response)} chars{' (truncated)' if truncated else ''}")
+
+    def run_stream(self, buffer, events):
+        """Copy `events` into `buffer`.
+
+        A client that drops has SSE_REPLAY["DISCONNECT_GRACE"] seconds to
+        reconnect; after that, or when the stream is superseded, the
+        generator is closed, which cancels the upstream request.
+        """
+        grace = settings.SSE_REPLAY["DISCONNECT_GRACE"]
+        try:
+            for event in events:
+                buffer.append(event)
+                touch_stream(buffer)
+                # Past "complete" only the history save is left; let it run
+                reason = buffer.stop_reason(grace) if event.get('type') != 'complete' else None
+                if reason:
+                    events.close()
+                    buffer.append({'type': 'cancelled', 'reason': reason})
+                    logger.info(f"Cancelled stream {buffer.id}: {reason}")
+                    break
+        finally:
+            finish_stream(buffer)
+            close_old_connections()
+
+    def start_stream(self, user, events):
+        """Run `events` on a background thread and answer with its SSE stream."""
+        buffer = create_stream(user)
+        threading.Thread(
+            target=self.run_stream,
+            args=(buffer, events),
+            name=f"chat-stream-{buffer.id}",
+            daemon=True,
+        ).start()
+        return self.sse_response(buffer)
+
+    def event_stream(self, buffer, last_seq=-1):
+        """SSE body for `buffer`, starting after event `last_seq`."""
+        # Closed by the server when the client disconnects, which detaches us
+        buffer.attach()
+        try:
+            for seq, event in buffer.follow(last_seq, heartbeat=settings.SSE_REPLAY["HEARTBEAT"]):
+                if seq is None:
+                    yield ": keep-alive\n\n"
+                else:
+                    yield format_event(buffer.id, seq, event)
+        except ReplayWindowExceeded:
+            yield f"data: {json.dumps({'type': 'error', 'error': 'Stream can no longer be resumed'})}\n\n"
+        finally:
+            buffer.detach()
+
+    def sse_response(self, buffer, last_seq=-1):
+        response = StreamingHttpResponse(
+            self.event_stream(buffer, last_seq),
+            content_type='text/event-stream'
+        )
+
+        # Headers for SSE
+        response['Access-Control-Allow-Origin'] = '*'
+        response['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
+        response['Access-Control-Allow-Headers'] = 'Content-Type, Last-Event-ID'
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        response['X-Stream-ID'] = buffer.id
+        return response
+
+    def resume(self, request, stream_id=None):
+        """Resume a stream from the request's Last-Event-ID, or None if there is nothing to resume."""
+        last_event_id = request.headers.get('Last-Event-ID') or request.query_params.get('last_event_id')
+        event_stream_id, last_seq = parse_last_event_id(last_event_id)
+        stream_id = stream_id or event_stream_id
+        if stream_id is None:
+            return None
+        if event_stream_id not in (None, stream_id):
+            return None
+        buffer = get_stream(stream_id, request.user)
+        if buffer is None:
+            return None
+        logger.info(f"Resuming stream {stream_id} after event {last_seq}")
+        return self.sse_response(buffer, -1 if last_seq is None else last_seq)
+
+    def post(self, request, stream_id=None):
         """Handle streaming chat requests."""
+        # A reconnect carrying Last-Event-ID picks up the running stream
+        if stream_id is not None or 'Last-Event-ID' in request.headers:
+            response = self.resume(request, stream_id)
+            if response is not None:
+                return response
+            if stream_id is not None:
+                return Response({"error": "Stream not found or expired."}, status=404)
+
+        conversation = get_request_conversation(request)
         try:
             logger.info("Streaming chat request received")
             logger.info(f"Request data: {request.data}")
@@ -167,31 +280,104 @@ Important instructions:
                 return Response({"error": "No prompt provided"}, status=400)
 
             image_file = request.FILES.get('image', None)
+            if image_file:
+                # Generation outlives the request, so don't hold on to the upload
+                image_file = ContentFile(image_file.read(), name=image_file.name)
 
-            # ✅ Pass request.user to generator
-            response = StreamingHttpResponse(
-                self.stream_response_generator(prompt, image_file, request.user),  # ✅ user passed here
-                content_type='text/event-stream'
+            # ✅ Pass request.user to the generation thread
+            return self.start_stream(
+                request.user, self.stream_response_generator(prompt, image_file, request.user, conversation)
             )
 
-            # Headers for SSE
-            response['Access-Control-Allow-Origin'] = '*'
-            response['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
-            response['Access-Control-Allow-Headers'] = 'Content-Type'
-            response['Cache-Control'] = 'no-cache'
-            response['X-Accel-Buffering'] = 'no'
-
-            return response
-
         except Exception as e:
             logger.error(f"Error in StreamingChatBotView: {str(e)}")
             logger.exception("Full exception details:")
             return Response({"error": f"Server error: {str(e)}"}, status=500)
 
-    def options(self, request):
+    def get(self, request, stream_id=None):
+        """Reconnect to a stream, replaying events after Last-Event-ID."""
+        response = self.resume(request, stream_id)
+        if response is None:
+            return Response({"error": "Stream not found or expired."}, status=404)
+        return response
+
+    def options(self, request, *args, **kwargs):
         """Handle preflight CORS requests."""
         response = Response()
         response['Access-Control-Allow-Origin'] = '*'
         response['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
-        response['Access-Control-Allow-Headers'] = 'Content-Type'
+        response['Access-Control-Allow-Headers'] = 'Content-Type, Last-Event-ID'
         return response
+
+
+class VoiceChatView(StreamingChatBotView):
+    """Spoken question in, streamed answer out, in a single request.
+
+    Takes `audio` (plus optional `image` and `language`), transcribes it,
+    strips the glasses' control words and streams a `transcript` event
+    followed by the usual chat-stream events.
+    """
+    parser_classes = (MultiPartParser, FormParser)
+
+    def voice_events(
+        self, temp_files, temp_path, audio_format, language, image_file, user, conversation=None, digest=None
+    ):
+        try:
+            with temp_files:
+                result = transcribe_file(temp_path, language=language, audio_format=audio_format, digest=digest)
+        except Exception as e:
+            logger.error(f"Error transcribing voice chat: {str(e)}")
+            yield {'type': 'error', 'error': f'Transcription failed: {str(e)}'}
+            return
+
+        prompt = strip_control_words(result["text"])
+        yield {
+            'type': 'transcript',
+            'text': prompt,
+            'model': result["model"],
+            'language': result["language"],
+            'duration': result["duration"],
+            'seconds_saved': result["seconds_saved"],
+            'cached': result["cached"],
+        }
+        if not prompt:
+            yield {'type': 'error', 'error': 'No speech recognized'}
+            return
+
+        yield from self.stream_response_generator(prompt, image_file, user, conversation)
+
+    def post(self, request):
+        # A reconnect carrying Last-Event-ID picks up the running stream
+        if 'Last-Event-ID' in request.headers:
+            response = self.resume(request)
+            if response is not None:
+                return response
+
+        audio_file = request.FILES.get("audio")
+        if not audio_file:
+            return Response({"error": "No audio file provided."}, status=400)
+
+        audio_format = sniff_upload(audio_file)
+        if audio_format is None:
+            return Response(
+                {"error": "Unsupported audio format. Send WAV, Ogg (Opus/Vorbis), FLAC or WebM."},
+                status=415
+            )
+
+        language = request.data.get("language") or None
+        conversation = get_request_conversation(request)
+
+        image_file = request.FILES.get('image', None)
+        if image_file:
+            image_file = ContentFile(image_file.read(), name=image_file.name)
+
+        # Released by voice_events once the audio is transcribed
+        temp_files = RequestTempFiles()
+        chunks = HashingChunks(audio_file.chunks())
+        temp_path = temp_files.create(suffix=AUDIO_SUFFIXES[audio_format], chunks=chunks)
+
+        events = self.voice_events(
+            temp_files, temp_path, audio_format, language, image_file, request.user, conversation,
+            digest=chunks.hexdigest(),
+        )
+        return self.start_stream(request.user, events)
@@ -0,0 +1,90 @@
+# tempfiles.py
+import logging
+import os
+import tempfile
+import threading
+import time
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def temp_dir():
+    """Directory that holds every temporary file the API creates (and nothing else)."""
+    path = settings.TEMP_FILES["DIR"]
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class RequestTempFiles:
+    """Tracks the temporary files created while handling one request.
+
+    Use as a context manager; every file created through it is removed on
+    exit, whether the request succeeded or not.
+    """
+
+    def __init__(self):
+        self.paths = []
+
+    def create(self, suffix="", chunks=()):
+        """Create a temp file, write `chunks` into it and return its path."""
+        fd, path = tempfile.mkstemp(suffix=suffix, dir=temp_dir())
+        self.paths.append(path)
+        with os.fdopen(fd, "wb") as tmp:
+            for chunk in chunks:
+                tmp.write(chunk)
+        return path
+
+    def release(self):
+        while self.paths:
+            path = self.paths.pop()
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"Error removing temp file {path}: {str(e)}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+def sweep_temp_files(max_age=None):
+    """Remove temp files older than `max_age` seconds left behind by crashed workers."""
+    max_age = settings.TEMP_FILES["MAX_AGE"] if max_age is None else max_age
+    cutoff = time.time() - max_age
+    removed = 0
+    with os.scandir(temp_dir()) as entries:
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+def _run_sweeper(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            removed = sweep_temp_files()
+            if removed:
+                logger.info(f"Removed {removed} stale temp files")
+        except Exception as e:
+            logger.error(f"Temp file sweep failed: {str(e)}")
+
+
+def start_sweeper():
+    """Start the periodic temp-file sweeper if TEMP_FILES["SWEEP_INTERVAL"] is set."""
+    interval = settings.TEMP_FILES.get("SWEEP_INTERVAL")
+    if not interval:
+        return None
+    thread = threading.Thread(target=_run_sweeper, args=(interval,), name="temp-file-sweeper", daemon=True)
+    thread.start()
+    return thread
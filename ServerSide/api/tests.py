@@ -1,3 +1,1037 @@
-from django.test import TestCase
+import asyncio
+import base64
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+from urllib.parse import quote
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+from users.token_cleanup import purge_expired_tokens
+
+from . import jobs, transcription
+from .archive import archive_old_chats, compress_text, decompress_text
+from .media_cleanup import sweep_orphaned_images
+from .model_registry import ModelRegistry
+from .models import ArchivedChat, ChatHistory, Conversation
+from .renderers import msgpack
+from .serializers import ChatHistorySerializer, chat_history_rows
+from .sse_replay import ReplayWindowExceeded, StreamBuffer, create_stream, finish_stream
+from .streaming_views import StreamingChatBotView
+from .tempfiles import RequestTempFiles, sweep_temp_files
+from .upstream import KeyPool, UpstreamBusy, pool_from_settings
+from .vad import speech_regions, trim_silence
+
+
+def fake_chunk(content=None, usage=None):
+    choices = [] if content is None else [SimpleNamespace(delta=SimpleNamespace(content=content))]
+    return SimpleNamespace(model="fake-model", choices=choices, usage=usage)
+
+
+def fake_completion(content):
+    """A non-streaming chat completion answering `content`."""
+    return SimpleNamespace(
+        model="fake-model",
+        usage=SimpleNamespace(prompt_tokens=3, completion_tokens=1),
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+    )
+
+
+class FakePool:
+    """Stands in for upstream.get_pool(); streams `words`, calling on_chunk(index) after each."""
+
+    def __init__(self, words, on_chunk=None):
+        self.words = words
+        self.on_chunk = on_chunk
+        self.closed = False
+
+    def stream(self, **kwargs):
+        try:
+            for index, word in enumerate(self.words):
+                yield fake_chunk(word)
+                if self.on_chunk:
+                    self.on_chunk(index)
+            yield fake_chunk(usage=SimpleNamespace(prompt_tokens=3, completion_tokens=len(self.words)))
+        except GeneratorExit:
+            self.closed = True
+            raise
+
+
+class SqlitePragmaTests(TestCase):
+    def test_pragmas_are_applied_on_connect(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        wrapper = DatabaseWrapper({**connection.settings_dict, "NAME": os.path.join(directory, "db.sqlite3")})
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            values = {}
+            for name in ("journal_mode", "synchronous", "busy_timeout", "cache_size", "temp_store"):
+                cursor.execute(f"PRAGMA {name}")
+                values[name] = cursor.fetchone()[0]
+        # synchronous NORMAL = 1, temp_store MEMORY = 2
+        self.assertEqual(
+            values, {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 20000, "cache_size": -64000, "temp_store": 2}
+        )
+
+
+class TokenCleanupTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user("ivy", password="pw")
+        now = timezone.now()
+        self.tokens = {}
+        for name, expires_at in [(f"old{n}", now - timedelta(days=1)) for n in range(5)] + [("live", now + timedelta(days=1))]:
+            self.tokens[name] = OutstandingToken.objects.create(
+                user=user, jti=name, token=name, created_at=now - timedelta(days=2), expires_at=expires_at
+            )
+        for name in ("old0", "live"):
+            BlacklistedToken.objects.create(token=self.tokens[name])
+
+    def test_deletes_only_expired_rows_in_batches(self):
+        with mock.patch("users.token_cleanup.time.sleep") as sleep:
+            result = purge_expired_tokens(batch_size=2, pause=0.5)
+
+        self.assertEqual((result["blacklisted"], result["outstanding"]), (1, 5))
+        self.assertEqual(list(OutstandingToken.objects.values_list("jti", flat=True)), ["live"])
+        self.assertEqual(BlacklistedToken.objects.get().token.jti, "live")
+        # Outstanding rows go 2 + 2 + 1, pausing after each full batch
+        self.assertEqual(sleep.call_count, 2)
+
+
+class HealthProbeTests(SimpleTestCase):
+    def setUp(self):
+        self.registry = ModelRegistry()
+        patcher = mock.patch("api.health_views.registry", self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_readyz_turns_200_once_preload_finishes(self):
+        self.registry.register("tiny", lambda: object())
+        response = self.client.get("/readyz")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json(), {"status": "loading", "models": {"tiny": "pending"}})
+        self.assertEqual(self.client.get("/healthz").status_code, 200)
+
+        self.registry.start_background_loading().join(5)
+        response = self.client.get("/readyz")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"status": "ready", "models": {"tiny": "loaded"}})
+
+    def test_failed_model_keeps_readyz_503(self):
+        def broken():
+            raise RuntimeError("no weights")
+
+        self.registry.register("tiny", broken)
+        self.registry.load_all()
+        response = self.client.get("/readyz")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json(), {"status": "failed", "models": {"tiny": "failed: no weights"}})
+
+
+class StreamCancellationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice", password="pw")
+        self.view = StreamingChatBotView()
+
+    def run_stream(self, pool):
+        buffer = create_stream(self.user)
+        with mock.patch("api.streaming_views.get_pool", return_value=pool):
+            events = self.view.stream_response_generator("hi", None, self.user)
+            pool.buffer = buffer
+            self.view.run_stream(buffer, events)
+        return buffer, [event["type"] for _, event in buffer.events]
+
+    def test_cancel_after_last_token_keeps_completed_answer(self):
+        pool = FakePool(["Hello", " world"])
+        pool.on_chunk = lambda index: index == 1 and pool.buffer.cancel("superseded")
+        buffer, types = self.run_stream(pool)
+
+        self.assertEqual(types[-1], "complete")
+        self.assertNotIn("cancelled", types)
+        chat = ChatHistory.objects.get(user=self.user)
+        self.assertEqual(chat.response, "Hello world")
+        self.assertFalse(chat.truncated)
+        self.assertEqual(chat.completion_tokens, 2)
+
+    def test_cancel_mid_stream_closes_upstream_and_saves_partial_answer(self):
+        pool = FakePool(["Hello", " there", " world"])
+        pool.on_chunk = lambda index: index == 0 and pool.buffer.cancel("superseded")
+        buffer, types = self.run_stream(pool)
+
+        self.assertEqual(types[-1], "cancelled")
+        self.assertNotIn("complete", types)
+        self.assertTrue(pool.closed)
+        chat = ChatHistory.objects.get(user=self.user)
+        self.assertEqual(chat.response, "Hello there")
+        self.assertTrue(chat.truncated)
+
+    def test_disconnected_client_past_grace_is_cancelled(self):
+        pool = FakePool(["Hello", " world"])
+        with self.settings(SSE_REPLAY={**settings.SSE_REPLAY, "DISCONNECT_GRACE": -1}):
+            buffer, types = self.run_stream(pool)
+        self.assertEqual(types[-1], "cancelled")
+        self.assertEqual(buffer.events[-1][1]["reason"], "disconnected")
+        self.assertFalse(ChatHistory.objects.exists())
+
+
+class StreamResumeTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("bob", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.buffer = create_stream(self.user)
+        for word in ["one", "two", "three"]:
+            self.buffer.append({"type": "content", "content": word})
+        finish_stream(self.buffer)
+
+    def read_events(self, response):
+        self.assertEqual(response.status_code, 200)
+        body = b"".join(response.streaming_content).decode()
+        return [line for line in body.splitlines() if line.startswith("id: ")]
+
+    def test_resume_replays_events_after_last_event_id(self):
+        response = self.client.get(
+            reverse("chat-stream-resume", args=[self.buffer.id]), HTTP_LAST_EVENT_ID=f"{self.buffer.id}:0"
+        )
+        self.assertEqual(self.read_events(response), [f"id: {self.buffer.id}:1", f"id: {self.buffer.id}:2"])
+
+    def test_resume_without_last_event_id_replays_everything(self):
+        response = self.client.get(reverse("chat-stream-resume", args=[self.buffer.id]))
+        self.assertEqual(len(self.read_events(response)), 3)
+
+    def test_post_with_last_event_id_resumes(self):
+        for name in ("chat-stream", "voice-chat"):
+            response = self.client.post(reverse(name), {}, HTTP_LAST_EVENT_ID=f"{self.buffer.id}:1")
+            self.assertEqual(self.read_events(response), [f"id: {self.buffer.id}:2"])
+
+    def test_post_to_resume_url_resumes(self):
+        url = reverse("chat-stream-resume", args=[self.buffer.id])
+        response = self.client.post(url, {}, HTTP_LAST_EVENT_ID=f"{self.buffer.id}:1")
+        self.assertEqual(self.read_events(response), [f"id: {self.buffer.id}:2"])
+        response = self.client.post(reverse("chat-stream-resume", args=["missing"]), {"prompt": "hi"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_unknown_or_foreign_stream_is_404(self):
+        other = User.objects.create_user("carol", password="pw")
+        foreign = create_stream(other)
+        for stream_id in ("missing", foreign.id):
+            response = self.client.get(reverse("chat-stream-resume", args=[stream_id]))
+            self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.get(reverse("chat-stream")).status_code, 404)
+
+    def test_preflight_on_resume_url(self):
+        response = self.client.options(reverse("chat-stream-resume", args=[self.buffer.id]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_replay_window_exceeded(self):
+        buffer = StreamBuffer(self.user.pk, max_events=2)
+        for seq in range(4):
+            buffer.append({"seq": seq})
+        buffer.close()
+        with self.assertRaises(ReplayWindowExceeded):
+            list(buffer.follow(0))
+        self.assertEqual([seq for seq, _ in buffer.follow(1)], [2, 3])
+
+
+class TempFileTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        override = self.settings(TEMP_FILES={**settings.TEMP_FILES, "DIR": self.dir, "MAX_AGE": 60})
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_sweep_removes_stale_files_and_keeps_live_ones(self):
+        temp_files = RequestTempFiles()
+        stale = temp_files.create(chunks=[b"old"])
+        live = temp_files.create(chunks=[b"new"])
+        an_hour_ago = time.time() - 3600
+        os.utime(stale, (an_hour_ago, an_hour_ago))
+
+        self.assertEqual(sweep_temp_files(), 1)
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(live))
+
+    def test_request_files_are_removed_on_exit(self):
+        with RequestTempFiles() as temp_files:
+            path = temp_files.create(suffix=".wav", chunks=[b"a", b"b"])
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), b"ab")
+        self.assertFalse(os.path.exists(path))
+
+
+class ArchivedChatTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("dave", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.conversation = Conversation.objects.create(user=self.user)
+        old = timezone.now() - timedelta(days=400)
+        self.chats = []
+        for index, prompt in enumerate(["first", "second", "third"]):
+            chat = ChatHistory.objects.create(
+                user=self.user, conversation=self.conversation, prompt=prompt, response=f"answer {index}"
+            )
+            self.chats.append(chat)
+        # The two oldest go to the archive
+        ChatHistory.objects.filter(pk__in=[self.chats[0].pk, self.chats[1].pk]).update(timestamp=old)
+        ChatHistory.objects.filter(pk=self.chats[1].pk).update(timestamp=old + timedelta(minutes=1))
+        Conversation.objects.refresh_summaries([self.conversation.pk])
+        self.assertEqual(archive_old_chats(days=30, pause=0)["archived"], 2)
+
+    def summary(self):
+        self.conversation.refresh_from_db()
+        return self.conversation.message_count, self.conversation.preview
+
+    def test_archived_rows_show_up_in_history(self):
+        response = self.client.get(reverse("chat-history"), {"include_archived": "1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([chat["prompt"] for chat in response.data], ["third", "second", "first"])
+        self.assertEqual([chat.get("archived", False) for chat in response.data], [False, True, True])
+        self.assertEqual(len(self.client.get(reverse("chat-history")).data), 1)
+
+    def test_round_trip_keeps_text(self):
+        codec, data = compress_text("héllo " * 100)
+        self.assertEqual(decompress_text(codec, data), "héllo " * 100)
+
+    def test_delete_archived_chat(self):
+        response = self.client.delete(reverse("delete-chat", args=[self.chats[0].pk]))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(ArchivedChat.objects.filter(pk=self.chats[0].pk).exists())
+        self.assertEqual(self.summary(), (2, "third"))
+
+    def test_delete_live_chat_keeps_archived_in_summary(self):
+        self.client.delete(reverse("delete-chat", args=[self.chats[2].pk]))
+        self.assertEqual(self.summary(), (2, "second"))
+
+    def test_bulk_delete_covers_both_tables(self):
+        response = self.client.post(
+            reverse("bulk-delete-chat"), {"ids": [self.chats[1].pk, self.chats[2].pk]}, format="json"
+        )
+        self.assertEqual(response.data, {"deleted": 2})
+        self.assertEqual(self.summary(), (1, "first"))
+
+    def test_other_users_archived_chat_is_404(self):
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user("erin", password="pw"))
+        response = other.delete(reverse("delete-chat", args=[self.chats[0].pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+class ChatExportTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = self.settings(MEDIA_ROOT=self.media_root, CHAT_EXPORT={"CHUNK_SIZE": 2})
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user("val", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for prompt in ["archived", "one", "two", "three"]:
+            ChatHistory.objects.create(user=self.user, prompt=prompt, response="r")
+        ChatHistory.objects.create(
+            user=self.user, prompt="with image", response="r", image=ContentFile(b"\x89PNG", name="pic.png")
+        )
+        ChatHistory.objects.create(user=User.objects.create_user("wes", password="pw"), prompt="theirs", response="r")
+        ChatHistory.objects.filter(prompt="archived").update(timestamp=timezone.now() - timedelta(days=400))
+        archive_old_chats(days=30, pause=0)
+
+    def export(self, **params):
+        response = self.client.get(reverse("chat-history-export"), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        return [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+
+    def test_streams_every_row_oldest_first(self):
+        rows = self.export()
+        self.assertEqual([row["prompt"] for row in rows], ["archived", "one", "two", "three", "with image"])
+        self.assertFalse(any("image_data" in row for row in rows))
+
+    def test_inline_images(self):
+        rows = self.export(inline_images="1")
+        self.assertEqual(rows[-1]["image_data"], "data:image/png;base64," + base64.b64encode(b"\x89PNG").decode())
+        self.assertNotIn("image_data", rows[0])
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after=None):
+        super().__init__("rate limited")
+        headers = {} if retry_after is None else {"retry-after": str(retry_after)}
+        self.response = SimpleNamespace(headers=headers)
+
+
+class KeyPoolTests(SimpleTestCase):
+    def make_pool(self, keys=("key-aaaa", "key-bbbb"), max_in_flight=0, acquire_timeout=0.05):
+        return KeyPool(
+            list(keys), "http://upstream.invalid/v1", max_in_flight=max_in_flight, cooloff=5,
+            rate_window=60, acquire_timeout=acquire_timeout, max_attempts=3,
+        )
+
+    def test_acquire_spreads_requests_over_keys(self):
+        pool = self.make_pool()
+        first, second = pool.acquire(), pool.acquire()
+        self.assertNotEqual(first.key, second.key)
+        pool.release(first)
+        self.assertIs(pool.acquire(), first)
+
+    def test_no_limit_by_default(self):
+        pool = self.make_pool(keys=["key-aaaa"])
+        states = [pool.acquire() for _ in range(20)]
+        self.assertEqual(states[0].in_flight, 20)
+
+    def test_pool_from_settings_keeps_explicit_zero(self):
+        upstream = {**settings.UPSTREAM, "KEYS": ["key-aaaa"], "MAX_IN_FLIGHT_PER_KEY": 2}
+        with self.settings(UPSTREAM=upstream):
+            self.assertEqual(pool_from_settings().max_in_flight, 2)
+            self.assertEqual(pool_from_settings(max_in_flight=0).max_in_flight, 0)
+
+    def test_full_pool_times_out_then_frees_on_release(self):
+        pool = self.make_pool(keys=["key-aaaa"], max_in_flight=1)
+        state = pool.acquire()
+        with self.assertRaises(UpstreamBusy):
+            pool.acquire()
+        pool.release(state)
+        self.assertIs(pool.acquire(), state)
+
+    def test_rate_limited_key_cools_off(self):
+        pool = self.make_pool()
+        limited = pool.acquire()
+        pool.release(limited, RateLimited(retry_after=30))
+        status = {entry["key"]: entry for entry in pool.status()}
+        self.assertEqual(status[limited.label]["rate_limited"], 1)
+        self.assertGreater(status[limited.label]["cooling_for"], 29)
+        # Only the other key is handed out while the first cools off
+        others = [pool.acquire() for _ in range(3)]
+        self.assertTrue(all(state is not limited for state in others))
+
+    def test_cooloff_doubles_without_retry_after(self):
+        pool = self.make_pool(keys=["key-aaaa"])
+        first, second = pool.acquire(), pool.acquire()
+        pool.release(first, RateLimited())
+        self.assertAlmostEqual(pool.status()[0]["cooling_for"], 5, delta=0.5)
+        pool.release(second, RateLimited())
+        self.assertAlmostEqual(pool.status()[0]["cooling_for"], 10, delta=0.5)
+        with self.assertRaises(UpstreamBusy):
+            pool.acquire()
+
+    def test_complete_retries_429_on_another_key(self):
+        pool = self.make_pool()
+        calls = []
+
+        def client_for(state):
+            def create(**kwargs):
+                calls.append(state.key)
+                if len(calls) == 1:
+                    raise RateLimited()
+                return "answer"
+            return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+        with mock.patch.object(pool, "_client", side_effect=client_for):
+            self.assertEqual(pool.complete(model="m", messages=[]), "answer")
+        self.assertEqual(len(set(calls)), 2)
+        self.assertEqual([entry["in_flight"] for entry in pool.status()], [0, 0])
+
+
+class RendererNegotiationTests(TestCase):
+    def test_msgpack_only_offered_when_installed(self):
+        registered = 'api.renderers.MessagePackRenderer' in settings.REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES']
+        self.assertEqual(registered, msgpack is not None)
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user("fay", password="pw"))
+        response = client.get(reverse("chat-history"), HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response.status_code, 200 if msgpack is not None else 406)
+
+
+class ChatImageTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = self.settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user("gus", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.chat = ChatHistory.objects.create(
+            user=self.user, prompt="look", response="a cat",
+            image=ContentFile(b"\xff\xd8jpeg", name="my photo.jpeg"),
+        )
+        self.url = reverse("chat-image", args=[self.chat.pk])
+
+    def test_history_links_to_owner_checked_view(self):
+        self.assertEqual(self.client.get(reverse("chat-history")).data[0]["image"], self.url)
+        self.assertEqual(ChatHistorySerializer(self.chat).data["image"], self.url)
+        self.assertEqual(chat_history_rows(ChatHistory.objects.all())[0]["image"], self.url)
+
+    def test_fast_path_matches_serializer(self):
+        conversation = Conversation.objects.create(user=self.user)
+        ChatHistory.objects.create(user=self.user, conversation=conversation, prompt="plain", response="r", truncated=True)
+        chats = ChatHistory.objects.order_by("-timestamp")
+        self.assertEqual(chat_history_rows(chats), ChatHistorySerializer(chats, many=True).data)
+        self.assertEqual(len(chat_history_rows(chats)), 2)
+
+    def test_only_owner_can_read_image(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"\xff\xd8jpeg")
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user("hal", password="pw"))
+        self.assertEqual(other.get(self.url).status_code, 404)
+
+    def test_accel_redirect_path_is_quoted(self):
+        with self.settings(MEDIA_DELIVERY={**settings.MEDIA_DELIVERY, "BACKEND": "nginx"}):
+            response = self.client.get(self.url)
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/" + quote(self.chat.image.name))
+        self.assertNotIn(" ", response["X-Accel-Redirect"])
+
+
+class BulkDeleteTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = self.settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user("nia", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def chat(self, prompt, days_ago, **kwargs):
+        chat = ChatHistory.objects.create(user=self.user, prompt=prompt, response="r", **kwargs)
+        ChatHistory.objects.filter(pk=chat.pk).update(timestamp=timezone.now() - timedelta(days=days_ago))
+        return chat
+
+    def test_time_range_deletes_only_matching_rows(self):
+        self.chat("old", 10)
+        self.chat("recent", 1)
+        self.chat("today", 0)
+        other = User.objects.create_user("oli", password="pw")
+        ChatHistory.objects.create(user=other, prompt="theirs", response="r")
+        response = self.client.post(
+            reverse("bulk-delete-chat"),
+            {"after": (timezone.now() - timedelta(days=5)).isoformat(), "before": timezone.now().isoformat()},
+            format="json",
+        )
+        self.assertEqual(response.data, {"deleted": 2})
+        self.assertEqual(sorted(ChatHistory.objects.values_list("prompt", flat=True)), ["old", "theirs"])
+
+    def test_cleanup_keeps_images_still_referenced(self):
+        shared = self.chat("shared", 0, image=ContentFile(b"\xff\xd8one", name="one.jpeg"))
+        self.chat("keeps shared", 0, image=shared.image.name)
+        own = self.chat("own", 0, image=ContentFile(b"\xff\xd8two", name="two.jpeg"))
+        with mock.patch("api.views.schedule_image_cleanup") as schedule:
+            response = self.client.post(reverse("bulk-delete-chat"), {"ids": [shared.pk, own.pk]}, format="json")
+        self.assertEqual(response.data, {"deleted": 2})
+        self.assertEqual(sorted(schedule.call_args[0][0]), sorted([shared.image.name, own.image.name]))
+
+        self.assertEqual(sweep_orphaned_images(), 1)
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, shared.image.name)))
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, own.image.name)))
+
+    def test_needs_ids_or_range(self):
+        self.assertEqual(self.client.post(reverse("bulk-delete-chat"), {}, format="json").status_code, 400)
+
+
+class BatchChatTests(TestCase):
+    def test_mixed_items_each_get_a_response_or_an_error(self):
+        user = User.objects.create_user("pam", password="pw")
+        client = APIClient()
+        client.force_authenticate(user)
+
+        def complete(**kwargs):
+            if "boom" in json.dumps(kwargs["messages"][-1]):
+                raise RuntimeError("upstream failed")
+            return fake_completion("ok")
+
+        with mock.patch("api.views.get_pool", return_value=SimpleNamespace(complete=complete)):
+            response = client.post(
+                reverse("chat-batch"), {"items": ["first", {"prompt": ""}, {"prompt": "boom"}, "last"]}, format="json"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"], [
+            {"index": 0, "response": "ok"},
+            {"index": 1, "error": "No prompt provided"},
+            {"index": 2, "error": "upstream failed"},
+            {"index": 3, "response": "ok"},
+        ])
+        self.assertEqual(sorted(ChatHistory.objects.values_list("prompt", flat=True)), ["first", "last"])
+
+    def test_too_many_items_is_400(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user("quin", password="pw"))
+        items = ["hi"] * (settings.CHAT_BATCH["MAX_ITEMS"] + 1)
+        self.assertEqual(client.post(reverse("chat-batch"), {"items": items}, format="json").status_code, 400)
+
+
+def transcript_result(text="hello", cached=False):
+    return {"text": text, "model": "base", "language": "en", "duration": 1.0, "seconds_saved": 0.0, "cached": cached}
+
+
+class TranscribeUploadTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("rae", password="pw"))
+
+    def upload(self, name, data):
+        return self.client.post(
+            reverse("transcribe-audio"), {"audio": SimpleUploadedFile(name, data)}, format="multipart"
+        )
+
+    def test_opus_upload_is_accepted_by_its_content(self):
+        seen = {}
+
+        def fake_transcribe(path, language=None, audio_format=None, digest=None):
+            with open(path, "rb") as f:
+                seen.update(suffix=os.path.splitext(path)[1], format=audio_format, data=f.read())
+            return transcript_result()
+
+        opus = b"OggS\x00\x02" + b"\x00" * 22 + b"OpusHead"
+        with mock.patch("api.views.transcribe_file", side_effect=fake_transcribe):
+            response = self.upload("recording.bin", opus)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["transcription"], "hello")
+        self.assertEqual(seen, {"suffix": ".ogg", "format": "ogg", "data": opus})
+
+    def test_content_that_does_not_match_a_known_format_is_415(self):
+        with mock.patch("api.views.transcribe_file") as transcribe:
+            response = self.upload("recording.wav", b"ID3\x04\x00" + b"\x00" * 32)
+        self.assertEqual(response.status_code, 415)
+        transcribe.assert_not_called()
+
+
+class VoiceChatTests(TransactionTestCase):
+    """The answer is generated on a background thread, which only sees committed rows."""
+
+    def setUp(self):
+        self.user = User.objects.create_user("sal", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post_audio(self, transcript):
+        wav = b"RIFF\x24\x00\x00\x00WAVEfmt " + b"\x00" * 24
+        with mock.patch("api.streaming_views.transcribe_file", return_value=transcript_result(transcript)), \
+                mock.patch("api.streaming_views.get_pool", return_value=FakePool(["It's", " a cat"])):
+            response = self.client.post(
+                reverse("voice-chat"), {"audio": SimpleUploadedFile("q.wav", wav)}, format="multipart"
+            )
+            self.assertEqual(response.status_code, 200)
+            body = b"".join(response.streaming_content).decode()
+            time.sleep(0.2)  # the history save runs right after "complete"
+        return [json.loads(line[6:]) for line in body.splitlines() if line.startswith("data: ")]
+
+    def test_transcript_without_control_words_then_answer(self):
+        events = self.post_audio("Wait, what is this? Stop.")
+        self.assertEqual((events[0]["type"], events[0]["text"]), ("transcript", "what is this?"))
+        self.assertEqual("".join(event.get("content", "") for event in events), "It's a cat")
+        self.assertEqual(events[-1]["type"], "complete")
+        chat = ChatHistory.objects.get(user=self.user)
+        self.assertEqual((chat.prompt, chat.response), ("what is this?", "It's a cat"))
+
+    def test_only_control_words_is_an_error(self):
+        events = self.post_audio("stop")
+        self.assertEqual([event["type"] for event in events], ["transcript", "error"])
+        self.assertFalse(ChatHistory.objects.exists())
+
+
+class ConversationSummaryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("tom", password="pw"))
+
+    def create(self, title):
+        return self.client.post(reverse("conversations"), {"title": title}, format="json").data["id"]
+
+    def chat(self, prompt, conversation_id):
+        with mock.patch("api.views.get_pool", return_value=SimpleNamespace(complete=lambda **kwargs: fake_completion("ok"))):
+            response = self.client.post(reverse("chat"), {"prompt": prompt, "conversation_id": conversation_id}, format="json")
+        self.assertEqual(response.status_code, 200)
+
+    def summaries(self):
+        return [
+            (row["title"], row["message_count"], row["preview"])
+            for row in self.client.get(reverse("conversations")).data
+        ]
+
+    def test_summaries_follow_new_and_deleted_messages(self):
+        trip, work = self.create("trip"), self.create("work")
+        self.chat("where to?", trip)
+        self.chat("pack what?", trip)
+        self.chat("agenda", work)
+        # Most recently active first
+        self.assertEqual(self.summaries(), [("work", 1, "agenda"), ("trip", 2, "pack what?")])
+
+        latest = ChatHistory.objects.get(prompt="pack what?")
+        self.client.delete(reverse("delete-chat", args=[latest.pk]))
+        self.assertEqual(self.summaries(), [("work", 1, "agenda"), ("trip", 1, "where to?")])
+
+        messages = self.client.get(reverse("conversation-messages", args=[trip])).data
+        self.assertEqual([row["prompt"] for row in messages], ["where to?"])
+
+    def test_other_users_conversation_is_404(self):
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user("uma", password="pw"))
+        conversation = self.create("private")
+        self.assertEqual(other.get(reverse("conversation-messages", args=[conversation])).status_code, 404)
+        response = other.post(reverse("chat"), {"prompt": "hi", "conversation_id": conversation}, format="json")
+        self.assertEqual(response.status_code, 404)
+
+
+class ChatHistoryFilterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("ivy", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.conversation = Conversation.objects.create(user=self.user)
+        ChatHistory.objects.create(user=self.user, conversation=self.conversation, prompt="in", response="a")
+        ChatHistory.objects.create(user=self.user, prompt="out", response="b")
+
+    def test_filters_by_conversation(self):
+        for include_archived in ("0", "1"):
+            response = self.client.get(
+                reverse("chat-history"), {"conversation_id": self.conversation.pk, "include_archived": include_archived}
+            )
+            self.assertEqual([chat["prompt"] for chat in response.data], ["in"])
+
+    def test_non_integer_conversation_id_is_400(self):
+        response = self.client.get(reverse("chat-history"), {"conversation_id": "abc"})
+        self.assertEqual(response.status_code, 400)
+
+
+def tone(seconds, db, sample_rate=16000):
+    import numpy as np
+
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    # Amplitude for a sine whose mean power is `db` dBFS
+    amplitude = np.sqrt(2 * 10 ** (db / 10))
+    # Slow wobble like a voice's syllables, never down to silence
+    wobble = 1 + 0.3 * np.sin(2 * np.pi * 3 * t)
+    return (amplitude * wobble * np.sin(2 * np.pi * 220 * t)).astype("float32")
+
+
+class VadTests(SimpleTestCase):
+    def test_speech_between_silences_is_kept_and_silence_trimmed(self):
+        import numpy as np
+
+        audio = np.concatenate([tone(1, -90), tone(1, -20), tone(1, -90)])
+        trimmed, regions = trim_silence(audio)
+        self.assertEqual(len(regions), 1)
+        start, end = regions[0]
+        self.assertLess(start, 16000)
+        self.assertGreater(end, 32000)
+        self.assertLess(len(trimmed), len(audio))
+
+    def test_silence_gives_nothing(self):
+        trimmed, regions = trim_silence(tone(2, -90))
+        self.assertEqual(regions, [])
+        self.assertEqual(len(trimmed), 0)
+
+    def test_quiet_continuous_speech_is_kept_whole(self):
+        audio = tone(2, -48)
+        self.assertEqual(speech_regions(audio), [(0, len(audio))])
+
+    def test_loud_continuous_speech_is_kept_whole(self):
+        audio = tone(2, -15)
+        self.assertEqual(speech_regions(audio), [(0, len(audio))])
+
+
+class TranscriptCacheTests(SimpleTestCase):
+    def setUp(self):
+        for patcher in (
+            mock.patch("api.transcription._results", None),
+            mock.patch("api.transcription._transcribe", side_effect=lambda *args: transcript_result()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def transcribe(self, language=None):
+        return transcription.transcribe_file("clip.wav", language=language, audio_format="wav", digest="abc")
+
+    def test_same_audio_and_settings_hit_the_cache(self):
+        self.assertFalse(self.transcribe()["cached"])
+        result = self.transcribe()
+        self.assertTrue(result["cached"])
+        self.assertEqual(result["text"], "hello")
+        self.assertEqual(transcription._transcribe.call_count, 1)
+
+    def test_language_vad_and_model_changes_miss_the_cache(self):
+        self.transcribe()
+        self.assertFalse(self.transcribe(language="en")["cached"])
+        with self.settings(VAD={**settings.VAD, "ENABLED": not settings.VAD["ENABLED"]}):
+            self.assertFalse(self.transcribe()["cached"])
+        tiers = [(None, "tiny")]
+        with self.settings(TRANSCRIPTION={**settings.TRANSCRIPTION, "MODEL_TIERS": tiers}):
+            self.assertFalse(self.transcribe()["cached"])
+        self.assertTrue(self.transcribe()["cached"])
+        self.assertEqual(transcription._transcribe.call_count, 4)
+
+
+class JobStoreTests(TestCase):
+    def test_running_job_outlives_result_ttl_then_expires_after_finishing(self):
+        user = User.objects.create_user("jay", password="pw")
+        release = threading.Event()
+        job = jobs.submit(user, "chat", lambda: release.wait(5) and {"response": "ok"})
+        later = time.monotonic() + settings.JOBS["RESULT_TTL"] + 60
+
+        with mock.patch("api.cache.time.monotonic", return_value=later):
+            self.assertIs(jobs.get_job(job.id, user), job)
+        release.set()
+        self.assertTrue(job.wait(5))
+        self.assertEqual(jobs.get_job(job.id, user).to_dict()["result"], {"response": "ok"})
+
+        much_later = time.monotonic() + settings.JOBS["RESULT_TTL"] + 60
+        with mock.patch("api.cache.time.monotonic", return_value=much_later):
+            self.assertIsNone(jobs.get_job(job.id, user))
+
+
+class JobApiTests(TransactionTestCase):
+    """Jobs run on worker threads, which only see committed rows."""
+
+    def test_chat_job_submit_poll_result(self):
+        user = User.objects.create_user("kim", password="pw")
+        client = APIClient()
+        client.force_authenticate(user)
+        pool = SimpleNamespace(complete=lambda **kwargs: fake_completion("Hi!"))
+        with mock.patch("api.views.get_pool", return_value=pool):
+            response = client.post(reverse("job-chat"), {"prompt": "hello"}, format="json")
+            self.assertEqual(response.status_code, 202)
+            job_id = response.data["job_id"]
+            deadline = time.monotonic() + 5
+            while True:
+                data = client.get(reverse("job-detail", args=[job_id])).data
+                if data["status"] in ("done", "failed") or time.monotonic() > deadline:
+                    break
+                time.sleep(0.05)
+
+        self.assertEqual(data, {"job_id": job_id, "type": "chat", "status": "done", "result": {"response": "Hi!"}})
+        chat = ChatHistory.objects.get(user=user)
+        self.assertEqual((chat.response, chat.completion_tokens), ("Hi!", 1))
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user("lou", password="pw"))
+        self.assertEqual(other.get(reverse("job-detail", args=[job_id])).status_code, 404)
+
+
+class QueryInspectorTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("xia", password="pw")
+        for prompt in ("a", "b", "c"):
+            ChatHistory.objects.create(user=self.user, prompt=prompt, response="r")
+
+    def get_history(self, **config):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.settings(QUERY_INSPECTOR={**settings.QUERY_INSPECTOR, "ENABLED": True, **config}):
+            return client.get(reverse("chat-history"))
+
+    def test_counts_queries_in_headers_and_log(self):
+        with self.assertLogs("django.request", "INFO") as logs:
+            response = self.get_history()
+        self.assertGreater(int(response["X-Query-Count"]), 0)
+        self.assertIn("X-DB-Time-Ms", response)
+        self.assertIn(f"GET /api/chat-history/ 200 queries={response['X-Query-Count']} ", logs.output[-1])
+        self.assertTrue(logs.output[-1].startswith("INFO:"))
+
+    def test_repeated_query_shape_is_a_warning(self):
+        with self.assertLogs("django.request", "INFO") as logs:
+            self.get_history(N_PLUS_ONE_THRESHOLD=1)
+        self.assertTrue(logs.output[-1].startswith("WARNING:"))
+        self.assertIn(' n+1=1x"SELECT', logs.output[-1])
+
+    def test_disabled_by_default(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertNotIn("X-Query-Count", client.get(reverse("chat-history")))
+
+
+class UsageReportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user("kim", password="pw", is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        ChatHistory.objects.create(user=self.admin, prompt="p", response="r", model="m", prompt_tokens=4)
+
+    def test_filters_by_user(self):
+        response = self.client.get(reverse("usage-report"), {"user_id": self.admin.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["totals"]["prompt_tokens"], 4)
+
+    def test_window_with_utc_offset(self):
+        hour_ago = (timezone.now() - timedelta(hours=1)).isoformat()
+        response = self.client.get(reverse("usage-report"), {"since": hour_ago})
+        self.assertEqual(response.data["totals"]["prompt_tokens"], 4)
+        response = self.client.get(reverse("usage-report"), {"until": hour_ago})
+        self.assertFalse(response.data["totals"]["prompt_tokens"])
+
+    def test_bad_parameters_are_400(self):
+        for params in (
+            {"user_id": "abc"}, {"since": "2024-13-45T00:00:00Z"}, {"since": "yesterday"},
+            {"until": "2024-01-01T00:00:00"},
+        ):
+            self.assertEqual(self.client.get(reverse("usage-report"), params).status_code, 400)
+
+
+def run_socket(frames, until=lambda sent: False, timeout=5):
+    """Drive the glasses socket with `frames` (dicts sent as JSON, bytes as
+    binary, numbers as pauses) until `until(events)` holds or it closes.
+    Returns the JSON events sent back, then a close marker if it closed.
+    """
+    from chatbot_project.asgi import application
+
+    async def session():
+        inbox = asyncio.Queue()
+        events = []
+        done = asyncio.Event()
+
+        async def send(message):
+            if message["type"] == "websocket.accept":
+                return
+            if message["type"] == "websocket.close":
+                events.append({"closed": message["code"]})
+                done.set()
+                return
+            events.append(json.loads(message["text"]))
+            if until(events):
+                done.set()
+
+        async def feed():
+            await inbox.put({"type": "websocket.connect"})
+            for frame in frames:
+                if isinstance(frame, (int, float)):
+                    await asyncio.sleep(frame)
+                elif isinstance(frame, bytes):
+                    await inbox.put({"type": "websocket.receive", "bytes": frame})
+                else:
+                    await inbox.put({"type": "websocket.receive", "text": json.dumps(frame)})
+
+        app = asyncio.create_task(application({"type": "websocket", "path": "/ws/glasses/"}, inbox.get, send))
+        feeder = asyncio.create_task(feed())
+        try:
+            await asyncio.wait_for(done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        await inbox.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait([app], timeout=1)
+        feeder.cancel()
+        app.cancel()
+        return events
+
+    return asyncio.run(session())
+
+
+def has_event(kind, request_id=None):
+    return lambda events: any(
+        event.get("type") == kind and (request_id is None or event.get("id") == request_id) for event in events
+    )
+
+
+class GlassesSocketTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("lee", password="pw")
+
+    def token(self, user=None, seconds=None):
+        token = AccessToken.for_user(user or self.user)
+        if seconds is not None:
+            token.set_exp(lifetime=timedelta(seconds=seconds))
+        return str(token)
+
+    def test_bad_token_closes(self):
+        events = run_socket([{"type": "auth", "token": "nope"}])
+        self.assertEqual(events[-1], {"closed": 4401})
+
+    def test_unauthenticated_connection_closes_at_auth_timeout(self):
+        config = {**settings.GLASSES_SOCKET, "AUTH_TIMEOUT": 0.2}
+        started = time.monotonic()
+        with self.settings(GLASSES_SOCKET=config):
+            events = run_socket([])
+        self.assertEqual(events, [{"closed": 4401}])
+        self.assertLess(time.monotonic() - started, config["HEARTBEAT"])
+
+    def test_request_before_auth_closes(self):
+        events = run_socket([{"type": "chat", "id": "1", "prompt": "hi"}])
+        self.assertEqual(events[-1], {"closed": 4401})
+
+    def test_chat_streams_tagged_events_and_saves(self):
+        pool = FakePool(["Hi", " there"])
+        with mock.patch("api.streaming_views.get_pool", return_value=pool):
+            events = run_socket(
+                [{"type": "auth", "token": self.token()}, {"type": "chat", "id": "c1", "prompt": "hello"}],
+                until=has_event("complete", "c1"),
+            )
+            time.sleep(0.3)  # the save runs right after "complete"
+        self.assertEqual(events[0]["type"], "ready")
+        self.assertEqual(events[1], {"type": "accepted", "id": "c1"})
+        answer = "".join(event["content"] for event in events if event.get("type") == "content")
+        self.assertEqual(answer, "Hi there")
+        self.assertEqual(ChatHistory.objects.get(user=self.user).response, "Hi there")
+
+    def test_expired_token_refuses_requests_until_reauth(self):
+        with mock.patch("api.streaming_views.get_pool", return_value=FakePool(["ok"])):
+            events = run_socket(
+                [
+                    {"type": "auth", "token": self.token(seconds=1)}, 1.1,
+                    {"type": "chat", "id": "late", "prompt": "hi"},
+                    {"type": "auth", "token": self.token()},
+                    {"type": "chat", "id": "fresh", "prompt": "hi"},
+                ],
+                until=has_event("complete", "fresh"),
+            )
+            time.sleep(0.3)
+        late = [event for event in events if event.get("id") == "late"]
+        self.assertEqual([event.get("code") for event in late], ["token_expired"])
+        self.assertTrue(has_event("accepted", "fresh")(events))
+
+    def test_reauth_as_another_user_closes(self):
+        other = User.objects.create_user("max", password="pw")
+        events = run_socket([{"type": "auth", "token": self.token()}, {"type": "auth", "token": self.token(other)}])
+        self.assertEqual(events[-1], {"closed": 4401})
+
+    def test_pending_uploads_are_capped(self):
+        config = {**settings.GLASSES_SOCKET, "MAX_PENDING_UPLOADS": 2, "MAX_PENDING_BYTES": 10}
+        with self.settings(GLASSES_SOCKET=config):
+            events = run_socket(
+                [
+                    {"type": "auth", "token": self.token()},
+                    b"a\n1234", b"b\n1234", b"c\n1",
+                    b"b\n12345",
+                    {"type": "cancel", "id": "a"}, b"c\n1",
+                    {"type": "ping"},
+                ],
+                until=has_event("pong"),
+            )
+        errors = [(event.get("id"), event["error"]) for event in events if event.get("type") == "error"]
+        self.assertEqual(errors, [("c", "Too many pending uploads"), ("b", "Upload too large")])
+
+    def test_chat_counts_against_per_user_stream_cap(self):
+        http_stream = create_stream(self.user)
+        later = []
+        pool = FakePool(["one", " two", " three"])
+        pool.on_chunk = lambda index: index == 0 and later.append(create_stream(self.user))
+        with self.settings(SSE_REPLAY={**settings.SSE_REPLAY, "MAX_ACTIVE_PER_USER": 1}):
+            with mock.patch("api.streaming_views.get_pool", return_value=pool):
+                events = run_socket(
+                    [{"type": "auth", "token": self.token()}, {"type": "chat", "id": "c1", "prompt": "hi"}],
+                    until=has_event("cancelled", "c1"),
+                )
+                time.sleep(0.3)
+        for stream in [http_stream] + later:
+            finish_stream(stream)
+        self.assertEqual(http_stream.cancelled, "superseded")
+        self.assertEqual(events[-1], {"type": "cancelled", "id": "c1", "reason": "superseded"})
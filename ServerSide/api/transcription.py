@@ -0,0 +1,153 @@
+# transcription.py
+import logging
+import re
+import threading
+from functools import partial
+from django.conf import settings
+from .audio import SAMPLE_RATE, load_audio
+from .cache import TTLCache
+from .model_registry import registry
+from .vad import trim_silence
+
+logger = logging.getLogger(__name__)
+
+
+def english_variant(name):
+    """The English-only checkpoint for `name`; large/turbo have none."""
+    if name.endswith(".en") or name.startswith(("large", "turbo")):
+        return name
+    return f"{name}.en"
+
+
+def configured_models():
+    """Every whisper model the TRANSCRIPTION setting can route to."""
+    config = settings.TRANSCRIPTION
+    names = []
+    for _, name in config["MODEL_TIERS"]:
+        candidates = [name]
+        if config.get("ENGLISH_ONLY_MODELS"):
+            candidates.append(english_variant(name))
+        for candidate in candidates:
+            if candidate not in names:
+                names.append(candidate)
+    return names
+
+
+def _load_whisper(name):
+    import whisper
+    return whisper.load_model(name, device=settings.TRANSCRIPTION["DEVICE"])
+
+
+def register_whisper_models():
+    for name in configured_models():
+        registry.register(f"whisper:{name}", partial(_load_whisper, name))
+
+
+def get_model(name):
+    """Return the named whisper model; models stay loaded for the life of the process."""
+    register_whisper_models()
+    return registry.get(f"whisper:{name}")
+
+
+def select_model(duration, language=None):
+    """Pick the model name for a clip of `duration` seconds in `language`."""
+    config = settings.TRANSCRIPTION
+    name = config["MODEL_TIERS"][-1][1]
+    for max_seconds, tier_model in config["MODEL_TIERS"]:
+        if max_seconds is None or duration <= max_seconds:
+            name = tier_model
+            break
+
+    if language == "en" and config.get("ENGLISH_ONLY_MODELS"):
+        name = english_variant(name)
+    return name
+
+
+_results = None
+_results_lock = threading.Lock()
+_key_locks = {}
+
+
+def _result_cache():
+    global _results
+    if _results is None:
+        with _results_lock:
+            if _results is None:
+                config = settings.TRANSCRIPTION_CACHE
+                _results = TTLCache(maxsize=config["MAX_SIZE"], ttl=config["TTL"])
+    return _results
+
+
+def result_cache_key(digest, language):
+    """Audio hash + language + everything in settings that changes the transcript."""
+    models = "/".join(configured_models())
+    return f"{digest}:{language or 'auto'}:{models}:vad={int(settings.VAD['ENABLED'])}"
+
+
+def transcribe_file(path, language=None, audio_format=None, digest=None):
+    """Transcribe an audio file, reusing the cached result when `digest` (the
+    upload's sha256) has been transcribed with the same language and models.
+
+    Identical uploads arriving together wait for the first one's result
+    instead of decoding again.
+    """
+    if digest is None or not settings.TRANSCRIPTION_CACHE["MAX_SIZE"]:
+        return _transcribe(path, language, audio_format)
+
+    key = result_cache_key(digest, language)
+    with _results_lock:
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+    try:
+        with key_lock:
+            result = _result_cache().get(key)
+            if result is not None:
+                return dict(result, cached=True)
+            result = _transcribe(path, language, audio_format)
+            _result_cache().set(key, result)
+            return result
+    finally:
+        with _results_lock:
+            if not key_lock.locked():
+                _key_locks.pop(key, None)
+
+
+def _transcribe(path, language=None, audio_format=None):
+    """Transcribe with the model that fits the clip's speech duration and language.
+
+    With VAD enabled only the detected speech is decoded; `seconds_saved`
+    is how much audio that left out.
+    """
+    audio = load_audio(path, audio_format)
+    duration = len(audio) / SAMPLE_RATE
+    if settings.VAD["ENABLED"]:
+        audio, _ = trim_silence(audio)
+    speech_duration = len(audio) / SAMPLE_RATE
+    model_name = select_model(speech_duration, language)
+
+    if len(audio):
+        options = {"task": "transcribe"}
+        if language:
+            options["language"] = language
+        result = get_model(model_name).transcribe(audio, **options)
+    else:
+        # Nothing but silence: skip the model rather than let it invent text
+        result = {"text": ""}
+
+    return {
+        "text": result["text"],
+        "model": model_name,
+        "language": result.get("language", language),
+        "duration": round(duration, 2),
+        "seconds_saved": round(duration - speech_duration, 2),
+        "cached": False,
+    }
+
+
+def strip_control_words(text, words=None):
+    """Remove recorder control words ("stop", "wait", ...) from both ends of a transcript."""
+    words = words or settings.VOICE_CONTROL_WORDS
+    alternatives = "|".join(re.escape(word) for word in words)
+    separators = r"[\s,.!?;:]*"
+    text = re.sub(rf"^(?:{separators}\b(?:{alternatives})\b)+{separators}", "", text.strip(), flags=re.IGNORECASE)
+    text = re.sub(rf"(?:[\s,]*\b(?:{alternatives})\b{separators})+$", "", text, flags=re.IGNORECASE)
+    return text.strip()
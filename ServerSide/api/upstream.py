@@ -0,0 +1,212 @@
+# upstream.py
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HTTP_HEADERS = {
+    "HTTP-Referer": "https://eyeconic-chat.example",
+    "X-Title": "Eyeconic Chat App",
+}
+
+
+class UpstreamBusy(Exception):
+    """Every key is cooling off or at its in-flight limit."""
+
+
+def is_rate_limited(error):
+    return getattr(error, "status_code", None) == 429
+
+
+def retry_after(error):
+    """Seconds from the Retry-After header of a 429, if the upstream sent one."""
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class KeyState:
+    def __init__(self, key):
+        self.key = key
+        self.client = None
+        self.in_flight = 0
+        self.requests = 0
+        self.rate_limited = 0
+        self.recent_429s = deque()
+        self.cool_until = 0.0
+
+    @property
+    def label(self):
+        return f"...{self.key[-4:]}"
+
+
+class KeyPool:
+    """Upstream API keys, each request routed to the least-loaded healthy key.
+
+    A key takes at most `max_in_flight` requests at once (0 means no limit).
+    A key that gets a 429 cools off for the upstream's Retry-After, or for
+    COOLOFF seconds doubled per 429 in the last RATE_WINDOW seconds, and is
+    skipped until then. Requests that hit a 429 are retried on another key.
+    """
+
+    def __init__(self, keys, base_url, max_in_flight, cooloff, rate_window, acquire_timeout, max_attempts):
+        if not keys:
+            raise ValueError("KeyPool needs at least one API key")
+        self.states = [KeyState(key) for key in keys]
+        self.base_url = base_url
+        self.max_in_flight = max_in_flight
+        self.cooloff = cooloff
+        self.rate_window = rate_window
+        self.acquire_timeout = acquire_timeout
+        self.max_attempts = max_attempts
+        self._cond = threading.Condition()
+
+    def _client(self, state):
+        if state.client is None:
+            import openai
+
+            # Retries are ours to make, on a different key
+            state.client = openai.Client(
+                api_key=state.key,
+                base_url=self.base_url,
+                default_headers=DEFAULT_HTTP_HEADERS,
+                max_retries=0,
+            )
+        return state.client
+
+    def _recent_429s(self, state, now):
+        while state.recent_429s and state.recent_429s[0] < now - self.rate_window:
+            state.recent_429s.popleft()
+        return len(state.recent_429s)
+
+    def acquire(self):
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                healthy = [
+                    state for state in self.states
+                    if state.cool_until <= now and (not self.max_in_flight or state.in_flight < self.max_in_flight)
+                ]
+                if healthy:
+                    state = min(
+                        healthy, key=lambda s: (s.in_flight, self._recent_429s(s, now), s.requests)
+                    )
+                    state.in_flight += 1
+                    state.requests += 1
+                    return state
+                if now >= deadline:
+                    raise UpstreamBusy("All upstream API keys are busy or rate limited, try again shortly.")
+                # Wake when a request finishes or the next key leaves cool-off
+                wait = deadline - now
+                cooling = [state.cool_until - now for state in self.states if state.cool_until > now]
+                if cooling:
+                    wait = min(wait, min(cooling))
+                self._cond.wait(wait)
+
+    def release(self, state, error=None):
+        with self._cond:
+            state.in_flight -= 1
+            if error is not None and is_rate_limited(error):
+                now = time.monotonic()
+                state.rate_limited += 1
+                recent = self._recent_429s(state, now)
+                state.recent_429s.append(now)
+                cooloff = retry_after(error) or self.cooloff * 2 ** min(recent, 5)
+                state.cool_until = max(state.cool_until, now + cooloff)
+                logger.warning(f"Upstream key {state.label} rate limited, cooling off for {cooloff:.1f}s")
+            self._cond.notify_all()
+
+    @contextmanager
+    def lease(self):
+        """An OpenAI client on the chosen key, counted in flight until the block exits."""
+        state = self.acquire()
+        try:
+            yield self._client(state)
+        except Exception as e:
+            self.release(state, e)
+            raise
+        self.release(state)
+
+    def _call(self, fn):
+        """fn(client) on the best key, retried on another key after a 429."""
+        for attempt in range(self.max_attempts):
+            try:
+                with self.lease() as client:
+                    return fn(client)
+            except Exception as e:
+                if not is_rate_limited(e) or attempt == self.max_attempts - 1:
+                    raise
+
+    def complete(self, **kwargs):
+        return self._call(lambda client: client.chat.completions.create(**kwargs))
+
+    def stream(self, **kwargs):
+        """Yield the chunks of a streamed completion, holding the key until done."""
+        for attempt in range(self.max_attempts):
+            state = self.acquire()
+            try:
+                chunks = self._client(state).chat.completions.create(stream=True, **kwargs)
+            except Exception as e:
+                self.release(state, e)
+                if not is_rate_limited(e) or attempt == self.max_attempts - 1:
+                    raise
+                continue
+            try:
+                yield from chunks
+            except Exception as e:
+                self.release(state, e)
+                raise
+            except GeneratorExit:
+                chunks.close()
+                self.release(state)
+                raise
+            self.release(state)
+            return
+
+    def status(self):
+        now = time.monotonic()
+        with self._cond:
+            return [
+                {
+                    "key": state.label,
+                    "in_flight": state.in_flight,
+                    "requests": state.requests,
+                    "rate_limited": state.rate_limited,
+                    "cooling_for": round(max(state.cool_until - now, 0), 1),
+                }
+                for state in self.states
+            ]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pool_from_settings(keys=None, base_url=None, max_in_flight=None):
+    config = settings.UPSTREAM
+    return KeyPool(
+        keys or config["KEYS"],
+        base_url or config["BASE_URL"],
+        # 0 means unlimited, so only None falls back to the setting
+        max_in_flight=config["MAX_IN_FLIGHT_PER_KEY"] if max_in_flight is None else max_in_flight,
+        cooloff=config["COOLOFF"],
+        rate_window=config["RATE_WINDOW"],
+        acquire_timeout=config["ACQUIRE_TIMEOUT"],
+        max_attempts=config["MAX_ATTEMPTS"],
+    )
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pool_from_settings()
+    return _pool
@@ -1,11 +1,29 @@
 from django.urls import path
-from .views import ChatBotView, ChatHistoryView,DeleteChatView,TranscribeAudioView
-from .streaming_views import StreamingChatBotView
+from .views import ChatBotView, BatchChatView, ChatHistoryView,DeleteChatView,BulkDeleteChatView,TranscribeAudioView
+from .streaming_views import StreamingChatBotView, VoiceChatView
+from .conversation_views import ConversationListView, ConversationMessagesView
+from .export_views import ChatExportView
+from .media_views import ChatImageView
+from .usage_views import UsageReportView
+from .job_views import ChatJobView, TranscribeJobView, JobDetailView, JobEventsView
 
 urlpatterns = [
     path('chat/', ChatBotView.as_view(), name='chat'),
+    path('chat/batch/', BatchChatView.as_view(), name='chat-batch'),
     path('chat-stream/', StreamingChatBotView.as_view(), name='chat-stream'),
+    path('chat-stream/<str:stream_id>/', StreamingChatBotView.as_view(), name='chat-stream-resume'),
     path('chat-history/', ChatHistoryView.as_view(), name='chat-history'),
+    path('chat-history/export/', ChatExportView.as_view(), name='chat-history-export'),
+    path('conversations/', ConversationListView.as_view(), name='conversations'),
+    path('conversations/<int:conversation_id>/messages/', ConversationMessagesView.as_view(), name='conversation-messages'),
     path('chat/<int:chat_id>/delete/', DeleteChatView.as_view(), name='delete-chat'),
+    path('chat/<int:chat_id>/image/', ChatImageView.as_view(), name='chat-image'),
+    path('chat/bulk-delete/', BulkDeleteChatView.as_view(), name='bulk-delete-chat'),
     path('transcribe-audio/', TranscribeAudioView.as_view(), name='transcribe-audio'),
+    path('voice-chat/', VoiceChatView.as_view(), name='voice-chat'),
+    path('usage/', UsageReportView.as_view(), name='usage-report'),
+    path('jobs/chat/', ChatJobView.as_view(), name='job-chat'),
+    path('jobs/transcribe-audio/', TranscribeJobView.as_view(), name='job-transcribe-audio'),
+    path('jobs/<str:job_id>/', JobDetailView.as_view(), name='job-detail'),
+    path('jobs/<str:job_id>/events/', JobEventsView.as_view(), name='job-events'),
 ]
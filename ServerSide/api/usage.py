@@ -0,0 +1,92 @@
+# usage.py
+import math
+import time
+from django.db.models import Count, Q, Sum
+
+PERCENTILES = (50, 90, 99)
+TIMING_FIELDS = ("ttft_ms", "duration_ms")
+
+
+class UsageMeter:
+    """Times one upstream completion and collects the usage ChatHistory records for it."""
+
+    def __init__(self, has_image=False):
+        self.has_image = has_image
+        self.model = ""
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.started = time.monotonic()
+        self.first_token_at = None
+        self.finished_at = None
+
+    def first_token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+
+    def record(self, response, model=""):
+        """Take the served model and token counts from a completion or stream chunk."""
+        self.model = getattr(response, "model", None) or self.model or model
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self.prompt_tokens = usage.prompt_tokens
+            self.completion_tokens = usage.completion_tokens
+
+    def finish(self):
+        if self.finished_at is None:
+            self.finished_at = time.monotonic()
+
+    def fields(self):
+        """ChatHistory field values; the meter is finished if it wasn't already."""
+        self.finish()
+        to_ms = lambda at: None if at is None else round((at - self.started) * 1000)
+        return {
+            "model": self.model,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "ttft_ms": to_ms(self.first_token_at),
+            "duration_ms": to_ms(self.finished_at),
+            "has_image": self.has_image,
+        }
+
+
+def percentiles(queryset, field, count, points=PERCENTILES):
+    """Nearest-rank percentiles of `field` over `queryset`, given `count`
+    non-null values: one ORDER BY ... LIMIT 1 OFFSET k query per point
+    rather than loading every row.
+    """
+    values = queryset.filter(**{f"{field}__isnull": False}).order_by(field).values_list(field, flat=True)
+    if not count:
+        return {f"p{point}": None for point in points}
+    return {
+        f"p{point}": values[max(math.ceil(point / 100 * count) - 1, 0)]
+        for point in points
+    }
+
+
+def summarize(queryset):
+    summary = queryset.aggregate(
+        messages=Count("id"),
+        with_image=Count("id", filter=Q(has_image=True)),
+        prompt_tokens=Sum("prompt_tokens"),
+        completion_tokens=Sum("completion_tokens"),
+        **{f"{field}_count": Count(field) for field in TIMING_FIELDS}
+    )
+    summary["prompt_tokens"] = summary["prompt_tokens"] or 0
+    summary["completion_tokens"] = summary["completion_tokens"] or 0
+    for field in TIMING_FIELDS:
+        summary[field] = percentiles(queryset, field, summary.pop(f"{field}_count"))
+    return summary
+
+
+def usage_report(queryset, group_by=None):
+    """Totals and TTFT/duration percentiles for `queryset`, overall and per
+    value of `group_by` (a ChatHistory field such as "model" or "source").
+    """
+    report = {"totals": summarize(queryset)}
+    if group_by:
+        keys = queryset.order_by(group_by).values_list(group_by, flat=True).distinct()
+        report["groups"] = [
+            {group_by: key, **summarize(queryset.filter(**{group_by: key}))}
+            for key in keys
+        ]
+    return report
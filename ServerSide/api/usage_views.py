@@ -0,0 +1,66 @@
+# usage_views.py
+from datetime import timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAdminUser
+from rest_framework import status
+from .models import ChatHistory
+from .usage import usage_report
+
+GROUP_BY_FIELDS = ("model", "source", "has_image", "user")
+
+
+def parse_query_datetime(value):
+    """Aware datetime from an ISO 8601 query value; None when empty.
+
+    Raises ValueError for anything unparseable or without a UTC offset.
+    """
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None or timezone.is_naive(parsed):
+        raise ValueError(value)
+    return parsed
+
+
+class UsageReportView(APIView):
+    """Token totals and TTFT/duration percentiles over a time window (staff only).
+
+    Query params: `since`/`until` (ISO 8601 with an offset, default the last 7 days),
+    `group_by` (one of GROUP_BY_FIELDS) and `user_id`.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            until = parse_query_datetime(request.query_params.get('until')) or timezone.now()
+            since = parse_query_datetime(request.query_params.get('since')) or until - timedelta(days=7)
+        except ValueError:
+            return Response(
+                {"error": "since/until must be ISO 8601 datetimes with a UTC offset."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        user_id = request.query_params.get('user_id')
+        if user_id:
+            try:
+                user_id = int(user_id)
+            except ValueError:
+                return Response({"error": "user_id must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        group_by = request.query_params.get('group_by') or None
+        if group_by is not None and group_by not in GROUP_BY_FIELDS:
+            return Response(
+                {"error": f"group_by must be one of: {', '.join(GROUP_BY_FIELDS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Served by the timestamp indexes
+        chats = ChatHistory.objects.filter(timestamp__gte=since, timestamp__lt=until)
+        if user_id:
+            chats = chats.filter(user_id=user_id)
+
+        report = usage_report(chats, group_by)
+        report["since"] = since
+        report["until"] = until
+        return Response(report)
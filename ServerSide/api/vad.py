@@ -0,0 +1,80 @@
+# vad.py
+from django.conf import settings
+from .audio import SAMPLE_RATE
+
+
+def speech_regions(audio, config=None):
+    """Find speech in a float32 16 kHz clip; returns [(start, end), ...] in samples.
+
+    An energy detector: frames louder than the clip's noise floor by
+    MARGIN_DB count as speech. Gaps shorter than MIN_SILENCE_MS are bridged,
+    regions shorter than MIN_SPEECH_MS dropped, and PADDING_MS kept on each
+    side so word onsets and tails aren't clipped. A clip with no silence at
+    all (its floor above MIN_DB) and nothing standing out is kept whole.
+    """
+    import numpy as np
+
+    config = config or settings.VAD
+    frame = int(SAMPLE_RATE * config["FRAME_MS"] / 1000)
+    frame_count = len(audio) // frame
+    if frame_count == 0:
+        return []
+
+    frames = audio[:frame_count * frame].reshape(frame_count, frame)
+    energy_db = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    noise_floor = np.percentile(energy_db, 10)
+    if noise_floor > config["MIN_DB"] + config["MARGIN_DB"]:
+        # Even the quietest frames are loud: there is no silence to drop
+        return [(0, len(audio))]
+    threshold = max(noise_floor + config["MARGIN_DB"], config["MIN_DB"])
+    # Even the quietest frames are audible: quiet but continuous sound, maybe speech
+    audible_floor = noise_floor > config["MIN_DB"]
+    voiced = np.flatnonzero(energy_db > threshold)
+    if voiced.size == 0:
+        return [(0, len(audio))] if audible_floor else []
+
+    to_frames = lambda ms: max(int(ms / config["FRAME_MS"]), 1)
+    min_silence, min_speech, padding = (
+        to_frames(config["MIN_SILENCE_MS"]), to_frames(config["MIN_SPEECH_MS"]), to_frames(config["PADDING_MS"])
+    )
+
+    # Split the voiced frame indices wherever the gap is long enough to be silence
+    breaks = np.flatnonzero(np.diff(voiced) > min_silence)
+    starts = np.concatenate(([voiced[0]], voiced[breaks + 1]))
+    ends = np.concatenate((voiced[breaks], [voiced[-1]])) + 1
+
+    regions = []
+    for start, end in zip(starts, ends):
+        if end - start < min_speech:
+            continue
+        start = max(start - padding, 0) * frame
+        end = min((end + padding) * frame, len(audio))
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    if not regions and audible_floor:
+        # Nothing stood out from an audible floor; better to decode it all than drop it
+        return [(0, len(audio))]
+    return regions
+
+
+def trim_silence(audio, config=None):
+    """Keep only the speech in `audio`, joined by GAP_MS of silence.
+
+    Returns (trimmed audio, regions); the trimmed clip is empty when no
+    speech was found.
+    """
+    import numpy as np
+
+    config = config or settings.VAD
+    regions = speech_regions(audio, config)
+    if not regions:
+        return audio[:0], regions
+    gap = np.zeros(int(SAMPLE_RATE * config["GAP_MS"] / 1000), dtype=audio.dtype)
+    pieces = []
+    for start, end in regions:
+        if pieces:
+            pieces.append(gap)
+        pieces.append(audio[start:end])
+    return np.concatenate(pieces), regions
@@ -1,74 +1,47 @@
 # views.py
-import google.generativeai as genai
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, JSONParser, FormParser
-from .models import ChatHistory
-from .serializers import ChatHistorySerializer
-from PIL import Image
+from .models import ArchivedChat, ChatHistory, Conversation
+from .conversation_views import get_request_conversation
+from .serializers import ArchivedChatSerializer, ChatHistorySerializer, BulkDeleteChatSerializer, chat_history_rows
+from .media_cleanup import schedule_image_cleanup
+from .tempfiles import RequestTempFiles
+import heapq
 import io
 import json
-import os
 import uuid
 import base64
-import openai
+import binascii
 import logging
 from django.conf import settings
+from django.db import transaction
 from dotenv import load_dotenv
-from django.core.files import File
-import tempfile
+from django.core.files.base import ContentFile
+from concurrent.futures import ThreadPoolExecutor
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import permission_classes
 from rest_framework import status
-from openai import OpenAI
-from django.core.files import File
-import tempfile
-import whisper
-<<<<<<< HEAD
+from .audio import AUDIO_SUFFIXES, HashingChunks, sniff_upload
+from .transcription import transcribe_file
+from .upstream import UpstreamBusy, get_pool
+from .usage import UsageMeter
 
 logger = logging.getLogger(__name__)
-=======
->>>>>>> 5d8cd179cdec0d528e635d1b6117018aa61d326a
 
 # Load environment variables
 load_dotenv()
 
-# Configure API keys
-<<<<<<< HEAD
-gemini_api_key = settings.GEMINI_API_KEY
-=======
->>>>>>> 5d8cd179cdec0d528e635d1b6117018aa61d326a
-openrouter_api_key = settings.OPENROUTER_API_KEY
-
-# Configure OpenRouter client
-openai.api_key = openrouter_api_key
-openai.base_url = "https://openrouter.ai/api/v1"
-
-DEFAULT_HTTP_HEADERS = {
-    "HTTP-Referer": "https://eyeconic-chat.example",
-    "X-Title": "Eyeconic Chat App",
-}
-
 @permission_classes([IsAuthenticated])
 class ChatBotView(APIView):
     parser_classes = (MultiPartParser, JSONParser, FormParser)
 
-    def __del__(self):
-        """Clean up any temporary files when the view is destroyed."""
-        try:
-            temp_dir = tempfile.gettempdir()
-            for filename in os.listdir(temp_dir):
-                if filename.endswith('.jpeg') and os.path.isfile(os.path.join(temp_dir, filename)):
-                    try:
-                        os.remove(os.path.join(temp_dir, filename))
-                    except:
-                        pass  # Ignore errors on cleanup
-        except:
-            pass  # We don't want cleanup to cause issues
-
-    def _get_relevant_history(self):
-        # Get last 10 interactions to maintain context
-        history = ChatHistory.objects.order_by('-timestamp')[:10]
+    def _get_relevant_history(self, user, conversation=None):
+        # Get the last 10 interactions of the conversation (or the user) to maintain context
+        if conversation is not None:
+            history = ChatHistory.objects.filter(conversation=conversation).order_by('-timestamp')[:10]
+        else:
+            history = ChatHistory.objects.filter(user=user).order_by('-timestamp')[:10]
         context = []
         for chat in reversed(history):  # Reverse to get chronological order
             context.append(f"User: {chat.prompt}")
@@ -77,6 +50,8 @@ class ChatBotView(APIView):
 
     def prepare_image(self, image_data):
         """Convert image data to base64 for AI processing."""
+        from PIL import Image
+
         try:
             # Convert to RGB format
             image = Image.open(io.BytesIO(image_data)).convert("RGB")
@@ -84,13 +59,97 @@ class ChatBotView(APIView):
             image.save(buffered, format="JPEG", quality=85)
             return base64.b64encode(buffered.getvalue()).decode("utf-8")
         except Exception as e:
-<<<<<<< HEAD
             logger.error(f"Error preparing image: {str(e)}")
-=======
->>>>>>> 5d8cd179cdec0d528e635d1b6117018aa61d326a
             raise ValueError(f"Error processing image: {str(e)}")
 
+    def _create_session(self):
+        """The upstream key pool; each completion leases the least-loaded key."""
+        return get_pool()
+
+    def _build_messages(self, prompt, img_base64, chat_history):
+        """Build the system + user messages for one prompt."""
+        system_message = {
+            "role": "system",
+            "content": f"""You are Eyeconic, a professional AI assistant and advisor. Only introduce yourself as "I am Eyeconic, your AI assistant and advisor" when explicitly asked about your identity, name, or who you are. Otherwise, focus on directly answering questions and providing assistance without introducing yourself.
+
+            You have access to previous conversation history for context:
+            {chat_history}
+
+            Important instructions:
+            1. Maintain professionalism in all responses
+            2. Remember and reference information users share about themselves from both current and previous conversations
+            3. Use the chat history to maintain context and personalize responses
+            4. Only introduce yourself when users specifically ask who you are
+            5. Analyze and respond to questions about images when they are provided
+            6. Acknowledge and build upon previous interactions when relevant"""
+        }
+
+        if img_base64:
+            # Image + text request
+            user_message = {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:image/jpeg;base64,{img_base64}",
+                            "detail": "high"
+                        }
+                    }
+                ]
+            }
+        else:
+            # Text-only request
+            user_message = {
+                "role": "user",
+                "content": prompt
+            }
+
+        return [system_message, user_message]
+
+    def _complete(self, session, messages, meter=None):
+        """Run one chat completion and return the answer text; `meter` gets its usage."""
+        model = "opengvlab/internvl3-14b"
+        response = session.complete(
+            model=model,
+            # model="qwen/qwen2.5-vl-3b-instruct:free",
+            messages=messages,
+            max_tokens=2000,
+        )
+        if meter is not None:
+            # The whole answer arrives at once, so time to first token is the full call
+            meter.first_token()
+            meter.finish()
+            meter.record(response, model)
+        return response.choices[0].message.content
+
+    def _answer(self, user, prompt, img_base64=None, image_file=None, conversation=None):
+        """Answer one prompt with the user's history as context and save it."""
+        session = self._create_session()
+
+        # Get chat history for context
+        chat_history = self._get_relevant_history(user, conversation)
+
+        meter = UsageMeter(has_image=bool(img_base64))
+        result_text = self._complete(session, self._build_messages(prompt, img_base64, chat_history), meter)
+
+        # Save to chat history
+        chat = ChatHistory.objects.create(
+            user=user,
+            conversation=conversation,
+            prompt=prompt,
+            image=image_file if image_file else None,
+            response=result_text,
+            source="mobile",  # Since we're focusing on mobile-first approach
+            **meter.fields()
+        )
+        if conversation is not None:
+            Conversation.objects.record_messages(conversation.pk, [chat])
+        return result_text
+
     def post(self, request):
+        conversation = get_request_conversation(request)
         try:
             prompt = request.data.get('prompt', '')
             if not prompt:
@@ -108,95 +167,109 @@ class ChatBotView(APIView):
                     img_base64 = base64.b64encode(img_bytes).decode('utf-8')
                     image_file.seek(0)  # Reset file pointer for later use
                 except Exception as e:
-<<<<<<< HEAD
                     logger.error(f"Error processing image: {str(e)}")
-=======
->>>>>>> 5d8cd179cdec0d528e635d1b6117018aa61d326a
                     return Response({"error": str(e)}, status=400)
 
-            # Set up OpenAI client
-            session = openai.Client(
-                api_key=openrouter_api_key,
-                base_url="https://openrouter.ai/api/v1",
-                default_headers=DEFAULT_HTTP_HEADERS
-            )
-
+            result_text = self._answer(request.user, prompt, img_base64, image_file, conversation)
+            return Response({"response": result_text})
 
-            # Get chat history for context
-            chat_history = self._get_relevant_history()
+        except UpstreamBusy as e:
+            return Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except Exception as e:
+            logger.error(f"Error in ChatBotView: {str(e)}")
+            return Response(
+                {"error": f"Server error: {str(e)}"},
+                status=500
+            )
 
-            # Prepare messages for the API
-            system_message = {
-                "role": "system",
-                "content": f"""You are Eyeconic, a professional AI assistant and advisor. Only introduce yourself as "I am Eyeconic, your AI assistant and advisor" when explicitly asked about your identity, name, or who you are. Otherwise, focus on directly answering questions and providing assistance without introducing yourself.
 
-            You have access to previous conversation history for context:
-            {chat_history}
+class BatchChatView(ChatBotView):
+    """Answer several prompts in one request.
 
-            Important instructions:
-            1. Maintain professionalism in all responses
-            2. Remember and reference information users share about themselves from both current and previous conversations
-            3. Use the chat history to maintain context and personalize responses
-            4. Only introduce yourself when users specifically ask who you are
-            5. Analyze and respond to questions about images when they are provided
-            6. Acknowledge and build upon previous interactions when relevant"""
-            }
+    Accepts JSON `{"items": [{"prompt": ..., "image": <base64, optional>}, ...]}`
+    or multipart with `items` as a JSON string and images uploaded as
+    `image_<index>`. Results come back in request order, each with either a
+    `response` or an `error`.
+    """
+    permission_classes = [IsAuthenticated]
 
-            if img_base64:
-                # Image + text request
-                user_message = {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{img_base64}",
-                                "detail": "high"
-                            }
-                        }
-                    ]
-                }
+    def _parse_items(self, request):
+        items = request.data.get('items')
+        if isinstance(items, str):
+            items = json.loads(items)
+        if not isinstance(items, list) or not items:
+            raise ValueError("'items' must be a non-empty list")
+        if len(items) > settings.CHAT_BATCH["MAX_ITEMS"]:
+            raise ValueError(f"At most {settings.CHAT_BATCH['MAX_ITEMS']} items per batch")
+
+        parsed = []
+        for index, item in enumerate(items):
+            if isinstance(item, str):
+                item = {"prompt": item}
+            elif not isinstance(item, dict):
+                raise ValueError(f"Item {index} must be an object or a string")
+            prompt = item.get("prompt", "")
+            image_file = request.FILES.get(f"image_{index}")
+            if image_file:
+                img_base64 = base64.b64encode(image_file.read()).decode('utf-8')
+                image_file.seek(0)
+            elif item.get("image"):
+                img_base64 = item["image"]
+                image_file = ContentFile(base64.b64decode(img_base64), name=f"{uuid.uuid4().hex}.jpeg")
             else:
-                # Text-only request
-                user_message = {
-                    "role": "user",
-                    "content": prompt
-                }
-
-            # Make API request
-            response = session.chat.completions.create(
-<<<<<<< HEAD
-                model="opengvlab/internvl3-14b:free",  # 14B model Huge iq accept image too
-                # model="qwen/qwen2.5-vl-3b-instruct:free",
-                messages=[system_message, user_message]
-=======
-                model="opengvlab/internvl3-14b",
-                # model="qwen/qwen2.5-vl-3b-instruct:free",
-                messages=[system_message, user_message],
-                max_tokens=2000,
->>>>>>> 5d8cd179cdec0d528e635d1b6117018aa61d326a
-            )
-
-            result_text = response.choices[0].message.content
+                img_base64 = None
+            parsed.append((prompt, img_base64, image_file))
+        return parsed
 
+    def post(self, request):
+        conversation = get_request_conversation(request)
+        try:
+            items = self._parse_items(request)
+        except (ValueError, TypeError, binascii.Error) as e:
+            return Response({"error": str(e)}, status=400)
 
-            # Save to chat history
-            ChatHistory.objects.create(
-                user=request.user,
-                prompt=prompt,
-                image=image_file if image_file else None,
-                response=result_text,
-                source="mobile"  # Since we're focusing on mobile-first approach
-            )
-
-            return Response({"response": result_text})
+        try:
+            session = self._create_session()
+            # History is loaded once and shared by every prompt in the batch
+            chat_history = self._get_relevant_history(request.user, conversation)
+
+            meters = [UsageMeter(has_image=bool(img_base64)) for _, img_base64, _ in items]
+
+            def answer(item, meter):
+                prompt, img_base64, _ = item
+                if not prompt:
+                    raise ValueError("No prompt provided")
+                return self._complete(session, self._build_messages(prompt, img_base64, chat_history), meter)
+
+            results = []
+            new_chats = []
+            with ThreadPoolExecutor(max_workers=settings.CHAT_BATCH["MAX_CONCURRENCY"]) as pool:
+                futures = [pool.submit(answer, item, meter) for item, meter in zip(items, meters)]
+                for index, (future, (prompt, _, image_file)) in enumerate(zip(futures, items)):
+                    try:
+                        result_text = future.result()
+                    except Exception as e:
+                        logger.error(f"Error in BatchChatView item {index}: {str(e)}")
+                        results.append({"index": index, "error": str(e)})
+                        continue
+                    results.append({"index": index, "response": result_text})
+                    new_chats.append(ChatHistory(
+                        user=request.user,
+                        conversation=conversation,
+                        prompt=prompt,
+                        image=image_file,
+                        response=result_text,
+                        source="mobile",
+                        **meters[index].fields()
+                    ))
+
+            ChatHistory.objects.bulk_create(new_chats)
+            if conversation is not None:
+                Conversation.objects.record_messages(conversation.pk, new_chats)
+            return Response({"results": results})
 
         except Exception as e:
-<<<<<<< HEAD
-            logger.error(f"Error in ChatBotView: {str(e)}")
-=======
->>>>>>> 5d8cd179cdec0d528e635d1b6117018aa61d326a
+            logger.error(f"Error in BatchChatView: {str(e)}")
             return Response(
                 {"error": f"Server error: {str(e)}"},
                 status=500
@@ -205,15 +278,30 @@ class ChatBotView(APIView):
 @permission_classes([IsAuthenticated])
 class ChatHistoryView(APIView):
     def get(self, request):
+        conversation_id = request.query_params.get('conversation_id')
+        if conversation_id:
+            try:
+                conversation_id = int(conversation_id)
+            except ValueError:
+                return Response({"error": "conversation_id must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
         try:
             chats = ChatHistory.objects.filter(user=request.user).order_by('-timestamp')
-            serializer = ChatHistorySerializer(chats, many=True)
-            return Response(serializer.data)
+            if conversation_id:
+                chats = chats.filter(conversation_id=conversation_id)
+            if request.query_params.get('include_archived') not in ('1', 'true'):
+                return Response(chat_history_rows(chats))
+
+            # Cold rows are only read (and decompressed) when asked for
+            archived = ArchivedChat.objects.filter(user=request.user).order_by('-timestamp')
+            if conversation_id:
+                archived = archived.filter(conversation_id=conversation_id)
+            merged = heapq.merge(chats, archived, key=lambda chat: chat.timestamp, reverse=True)
+            return Response([
+                (ArchivedChatSerializer if isinstance(chat, ArchivedChat) else ChatHistorySerializer)(chat).data
+                for chat in merged
+            ])
         except Exception as e:
-<<<<<<< HEAD
             logger.error(f"Error in ChatHistoryView: {str(e)}")
-=======
->>>>>>> 5d8cd179cdec0d528e635d1b6117018aa61d326a
             return Response(
                 {"error": f"Server error: {str(e)}"},
                 status=500
@@ -224,25 +312,60 @@ class DeleteChatView(APIView):
     permission_classes = [IsAuthenticated]
 
     def delete(self, request, chat_id):
-        try:
-            chat = ChatHistory.objects.get(id=chat_id, user=request.user)
-            chat.delete()
-            return Response({"message": "Chat deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
-        except ChatHistory.DoesNotExist:
+        # Archived chats keep their id, so look in the cold table too
+        chat = (
+            ChatHistory.objects.filter(id=chat_id, user=request.user).first()
+            or ArchivedChat.objects.filter(id=chat_id, user=request.user).first()
+        )
+        if chat is None:
             return Response({"error": "Chat not found or access denied."}, status=status.HTTP_404_NOT_FOUND)
-        
+        chat.delete()
+        Conversation.objects.refresh_summaries([chat.conversation_id])
+        if chat.image:
+            schedule_image_cleanup([chat.image.name])
+        return Response({"message": "Chat deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
 
 
-<<<<<<< HEAD
-@permission_classes([IsAuthenticated])
-class TranscribeAudioView(APIView):
-=======
-model = whisper.load_model("large-v3", device="cuda")
+class BulkDeleteChatView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = BulkDeleteChatSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+
+        querysets = []
+        for model in (ChatHistory, ArchivedChat):
+            chats = model.objects.filter(user=request.user)
+            if data.get("ids"):
+                chats = chats.filter(id__in=data["ids"])
+            if "after" in data:
+                chats = chats.filter(timestamp__gte=data["after"])
+            if "before" in data:
+                chats = chats.filter(timestamp__lt=data["before"])
+            querysets.append(chats)
+
+        try:
+            affected = []
+            deleted = 0
+            with transaction.atomic():
+                for chats in querysets:
+                    affected += chats.values_list("image", "conversation_id")
+                    # No dependents or delete signals, so each is a single DELETE
+                    deleted += chats.delete()[0]
+            Conversation.objects.refresh_summaries(conversation_id for _, conversation_id in affected)
+        except Exception as e:
+            logger.error(f"Error in BulkDeleteChatView: {str(e)}")
+            return Response({"error": f"Server error: {str(e)}"}, status=500)
+
+        schedule_image_cleanup(image for image, _ in affected)
+        return Response({"deleted": deleted})
+
 
 
 class TranscribeAudioView(APIView):
     permission_classes = [IsAuthenticated]
->>>>>>> 5d8cd179cdec0d528e635d1b6117018aa61d326a
     parser_classes = [MultiPartParser, FormParser]
 
     def post(self, request, format=None):
@@ -250,30 +373,31 @@ class TranscribeAudioView(APIView):
         if not audio_file:
             return Response({"error": "No audio file provided."}, status=400)
 
-<<<<<<< HEAD
-        # Save to temporary file
-=======
->>>>>>> 5d8cd179cdec0d528e635d1b6117018aa61d326a
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
-            for chunk in audio_file.chunks():
-                tmp.write(chunk)
-            temp_path = tmp.name
+        audio_format = sniff_upload(audio_file)
+        if audio_format is None:
+            return Response(
+                {"error": "Unsupported audio format. Send WAV, Ogg (Opus/Vorbis), FLAC or WebM."},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
 
-        try:
-<<<<<<< HEAD
-            model = whisper.load_model("small", device="cuda")
-            result = model.transcribe(temp_path)
-=======
-            result = model.transcribe(temp_path, task="transcribe")
->>>>>>> 5d8cd179cdec0d528e635d1b6117018aa61d326a
-            transcription = result["text"]
-        except Exception as e:
-            return Response({"error": str(e)}, status=500)
-        finally:
-            os.remove(temp_path)
-
-<<<<<<< HEAD
-        return Response({"transcription": transcription})
-=======
-        return Response({"transcription": transcription})
->>>>>>> 5d8cd179cdec0d528e635d1b6117018aa61d326a
+        language = request.data.get("language") or None
+
+        with RequestTempFiles() as temp_files:
+            chunks = HashingChunks(audio_file.chunks())
+            temp_path = temp_files.create(suffix=AUDIO_SUFFIXES[audio_format], chunks=chunks)
+            try:
+                result = transcribe_file(
+                    temp_path, language=language, audio_format=audio_format, digest=chunks.hexdigest()
+                )
+            except Exception as e:
+                logger.error(f"Error in TranscribeAudioView: {str(e)}")
+                return Response({"error": str(e)}, status=500)
+
+        return Response({
+            "transcription": result["text"],
+            "model": result["model"],
+            "language": result["language"],
+            "duration": result["duration"],
+            "seconds_saved": result["seconds_saved"],
+            "cached": result["cached"],
+        })
@@ -13,4 +13,26 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chatbot_project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from api.glasses_socket import glasses_socket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # HTTP goes to Django; the glasses client's WebSocket channel is served directly
+    if scope["type"] == "websocket":
+        return await glasses_socket_application(scope, receive, send)
+    return await django_application(scope, receive, send)
+
+
+# Load whisper models in the background; /readyz reports 503 until they are in
+from api.model_registry import start_model_loading  # noqa: E402
+# Periodic upkeep runs in serving processes only, not in migrate, shell or other commands
+from api.archive import start_periodic_archival  # noqa: E402
+from api.tempfiles import start_sweeper  # noqa: E402
+from users.token_cleanup import start_periodic_cleanup  # noqa: E402
+
+start_model_loading()
+start_sweeper()
+start_periodic_cleanup()
+start_periodic_archival()
@@ -1,9 +1,11 @@
 
 from pathlib import Path
 import os
+import tempfile
 import dotenv
 from dotenv import load_dotenv
 from datetime import timedelta
+from importlib.util import find_spec
 # Load environment variables
 load_dotenv()
 
@@ -24,15 +26,26 @@ DEBUG = True
 # Allow all hosts during development
 ALLOWED_HOSTS = ['*']
 
-<<<<<<< HEAD
 # API Keys - should be moved to .env in production
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 # Replace with your actual OpenRouter API key
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "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")
-=======
-# Replace with your actual OpenRouter API key
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "sk-or-v1-...")
->>>>>>> 5d8cd179cdec0d528e635d1b6117018aa61d326a
+
+# Upstream key pool (api/upstream.py). OPENROUTER_API_KEYS takes a comma-separated
+# list; requests go to the least-loaded key that isn't cooling off after a 429
+UPSTREAM = {
+    "BASE_URL": os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1"),
+    "KEYS": [key.strip() for key in os.getenv("OPENROUTER_API_KEYS", "").split(",") if key.strip()]
+    or [OPENROUTER_API_KEY],
+    # Requests a key may have in flight (a stream holds its slot until it ends);
+    # 0 means no limit. Set it to your plan's concurrency to queue excess
+    # requests for up to ACQUIRE_TIMEOUT seconds instead of taking 429s.
+    "MAX_IN_FLIGHT_PER_KEY": int(os.getenv("UPSTREAM_MAX_IN_FLIGHT_PER_KEY", "0")),
+    "COOLOFF": 5,  # seconds, doubled per recent 429 unless the upstream sends Retry-After
+    "RATE_WINDOW": 60,  # seconds a 429 counts as recent
+    "ACQUIRE_TIMEOUT": 30,  # seconds to wait for a free key before answering 503
+    "MAX_ATTEMPTS": 3,
+}
 
 
 # Application definition
@@ -53,14 +66,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     # CORS middleware - add this before CommonMiddleware
     'corsheaders.middleware.CorsMiddleware',
-<<<<<<< HEAD
-=======
-    'api.middleware.access_log.AccessLogMiddleware',
-
->>>>>>> 5d8cd179cdec0d528e635d1b6117018aa61d326a
+    # Inactive unless QUERY_INSPECTOR["ENABLED"]
+    'api.middleware.query_inspector.QueryInspectorMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -95,9 +106,26 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections open between requests instead of reconnecting every time
+        'CONN_MAX_AGE': int(os.getenv("DB_CONN_MAX_AGE", "600")),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Seconds the sqlite3 driver waits on a locked database before raising
+            'timeout': 20,
+        },
     }
 }
 
+# PRAGMAs applied to every new SQLite connection (see api/db.py)
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",      # readers no longer block on the writer
+    "synchronous": "NORMAL",    # safe with WAL, avoids an fsync per commit
+    "busy_timeout": 20000,      # ms
+    "cache_size": -64000,       # negative = KiB, i.e. 64 MB page cache
+    "mmap_size": 268435456,     # 256 MB
+    "temp_store": "MEMORY",
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -172,26 +200,109 @@ CORS_ALLOW_HEADERS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'chat_images')
 
+# Authenticated chat images (api/media_views.py, /api/chat/<id>/image/)
+MEDIA_DELIVERY = {
+    # "nginx" (X-Accel-Redirect), "sendfile" (X-Sendfile) or "" to stream from Django
+    "BACKEND": os.getenv("MEDIA_DELIVERY_BACKEND", ""),
+    # nginx `internal` location aliased to MEDIA_ROOT
+    "ACCEL_PREFIX": "/protected-media/",
+    "MAX_AGE": 60 * 60 * 24 * 365,  # chat images never change once written
+}
+
+# /api/chat/batch/ limits
+CHAT_BATCH = {
+    "MAX_ITEMS": 20,
+    "MAX_CONCURRENCY": 4,  # upstream calls in flight per batch
+}
+
+# Background jobs for /api/jobs/ (api/jobs.py). Jobs and their results live
+# in the process that ran them, so polling only works with a single worker
+# process (threads are fine); behind several, a poll can land elsewhere and 404.
+JOBS = {
+    "WORKERS": int(os.getenv("JOB_WORKERS", "4")),
+    "MAX_QUEUED": 32,       # jobs waiting for a worker before submissions get a 503
+    "RESULT_TTL": 600,      # seconds a finished job's result stays available
+    "MAX_STORED": 5000,
+    "HEARTBEAT": 15,        # seconds between SSE keep-alives while a job runs
+}
+
+# Replay buffers for resumable /api/chat-stream/ (api/sse_replay.py)
+SSE_REPLAY = {
+    "MAX_EVENTS": 4096,     # events kept per stream
+    "TTL": 120,             # seconds a stream stays resumable after its last event
+    "MAX_STREAMS": 1000,
+    "HEARTBEAT": 15,        # seconds between keep-alives on an idle stream
+    # Generation (and the upstream request) is cancelled once no client has
+    # been reading for this long; a reconnect within it resumes the stream
+    "DISCONNECT_GRACE": 10,
+    "MAX_ACTIVE_PER_USER": 3,  # starting another cancels the user's oldest stream
+}
+
+# Temporary files created while handling requests (api/tempfiles.py)
+TEMP_FILES = {
+    "DIR": os.getenv("EYECONIC_TEMP_DIR", os.path.join(tempfile.gettempdir(), "eyeconic")),
+    "MAX_AGE": 3600,         # seconds before the sweeper treats a file as a leftover
+    # Seconds between sweeps in the serving process (wsgi.py/asgi.py); 0 disables the sweeper
+    "SWEEP_INTERVAL": 600,
+}
+
+# Transcription (whisper) settings
+TRANSCRIPTION = {
+    "DEVICE": os.getenv("WHISPER_DEVICE", "cuda"),
+    # (max clip seconds, model) - a clip goes to the first tier it fits in,
+    # None means no upper bound. Every model listed here stays loaded once used.
+    "MODEL_TIERS": [
+        (float(os.getenv("WHISPER_SHORT_CLIP_SECONDS", "6")), "base"),
+        (float(os.getenv("WHISPER_MEDIUM_CLIP_SECONDS", "30")), "small"),
+        (None, "large-v3"),
+    ],
+    # Use the English-only checkpoint (e.g. base.en) when the client asks for English
+    "ENGLISH_ONLY_MODELS": True,
+}
+
+# Transcripts by audio sha256 + language + model config (api/transcription.py),
+# so client retries of the same recording skip the model; MAX_SIZE 0 disables it
+TRANSCRIPTION_CACHE = {
+    "MAX_SIZE": 512,
+    "TTL": 600,  # seconds
+}
+
+# Voice-activity trimming before whisper (api/vad.py): silence around the
+# glasses' control words is dropped so it's neither decoded nor hallucinated on
+VAD = {
+    "ENABLED": os.getenv("WHISPER_VAD", "1") == "1",
+    "FRAME_MS": 30,
+    "MARGIN_DB": 15,  # above the clip's noise floor
+    "MIN_DB": -55,  # never treat anything quieter than this as speech
+    "MIN_SPEECH_MS": 150,
+    "MIN_SILENCE_MS": 400,  # shorter pauses stay in, they're part of the sentence
+    "PADDING_MS": 200,
+    "GAP_MS": 150,  # silence left between joined speech regions
+}
+
+# Background model loading (api/model_registry.py). With PRELOAD off, models
+# load on first use and /readyz doesn't wait for them.
+MODEL_REGISTRY = {
+    "PRELOAD": os.getenv("PRELOAD_MODELS", "1") == "1",
+}
+
+# Words the glasses use to drive the recorder; stripped from /api/voice-chat/ transcripts
+VOICE_CONTROL_WORDS = ("stop", "wait", "continue")
+
 # Logging configuration
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'formatters': {
-<<<<<<< HEAD
-=======
         'access_format': {
             'format': '%(asctime)s %(levelname)s %(message)s',
         },
->>>>>>> 5d8cd179cdec0d528e635d1b6117018aa61d326a
         'verbose': {
             'format': '{levelname} {asctime} {module} {message}',
             'style': '{',
         },
     },
     'handlers': {
-<<<<<<< HEAD
-        'console': {
-=======
         'file_access': {
             'level': 'INFO',
             'class': 'logging.FileHandler',
@@ -200,12 +311,10 @@ LOGGING = {
         },
         'console': {
             'level': 'DEBUG',
->>>>>>> 5d8cd179cdec0d528e635d1b6117018aa61d326a
             'class': 'logging.StreamHandler',
             'formatter': 'verbose',
         },
     },
-<<<<<<< HEAD
     'root': {
         'handlers': ['console'],
         'level': 'INFO',
@@ -216,45 +325,102 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
-        'api': {
-            'handlers': ['console'],
-            'level': 'DEBUG',
-            'propagate': False,
-        },
-    },
-}
-
-=======
-    'loggers': {
         'django.request': {
             'handlers': ['file_access', 'console'],
             'level': 'INFO',
             'propagate': False,
         },
+        'api': {
+            'handlers': ['console'],
+            'level': 'DEBUG',
+            'propagate': False,
+        },
     },
 }
 
 
->>>>>>> 5d8cd179cdec0d528e635d1b6117018aa61d326a
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'users.authentication.CachedJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ) + (
+        # Sent when the client asks for Accept: application/msgpack; only
+        # offered when the optional msgpack package is installed
+        ('api.renderers.MessagePackRenderer',) if find_spec('msgpack') else ()
+    ),
+}
+
+# Response compression (api/middleware/compression.py); brotli is used when installed
+API_COMPRESSION = {
+    "MIN_SIZE": 1024,  # bytes; smaller bodies aren't worth the CPU
+    "CONTENT_TYPES": ("application/json", "application/msgpack"),
+    "GZIP_LEVEL": 6,
+    "BROTLI_QUALITY": 5,
+}
+
+# Per-request query count/time and N+1 detection in the access log
+# (api/middleware/query_inspector.py); meant for load tests, off by default
+QUERY_INSPECTOR = {
+    "ENABLED": os.getenv("QUERY_INSPECTOR", "0") == "1",
+    "N_PLUS_ONE_THRESHOLD": 5,  # same query shape this many times in one request
+    "SLOW_MS": 100,  # include the slowest statement's SQL above this
+    "SQL_PREVIEW": 160,  # characters of SQL written per flagged query
+}
+
+# In-process cache of users resolved from access tokens (users/authentication.py).
+# Each worker has its own copy and saves only invalidate the worker that made
+# them, so a deactivated user or changed password can stay authenticated in
+# the other workers for up to TTL; keep it to a burst of requests.
+AUTH_USER_CACHE = {
+    "MAX_SIZE": 10000,
+    "TTL": int(os.getenv("AUTH_USER_CACHE_TTL", "5")),  # seconds
 }
 
 
 SIMPLE_JWT = {
     "AUTH_TOKEN_CLASSES": ("rest_framework_simplejwt.tokens.AccessToken",),
     "BLACKLIST_AFTER_ROTATION": True,
-<<<<<<< HEAD
-    "ACCESS_TOKEN_LIFETIME": timedelta(days=1),
-    "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
-    "ROTATE_REFRESH_TOKENS": True,
-    "BLACKLIST_AFTER_ROTATION": True,
-}
-=======
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=1),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
     "ROTATE_REFRESH_TOKENS": True,
 }
->>>>>>> 5d8cd179cdec0d528e635d1b6117018aa61d326a
+
+# Expired token cleanup (users/token_cleanup.py, manage.py purge_expired_tokens)
+TOKEN_CLEANUP = {
+    "BATCH_SIZE": 500,
+    "BATCH_PAUSE": 0.05,  # seconds between batches, lets other writers in
+    # Run the cleanup inside the server process (wsgi.py/asgi.py) every N seconds; 0 disables it
+    "INTERVAL": int(os.getenv("TOKEN_CLEANUP_INTERVAL", "0")),
+}
+
+# NDJSON history export (api/export_views.py); rows fetched per cursor round trip
+CHAT_EXPORT = {
+    "CHUNK_SIZE": 500,
+}
+
+# Hot/cold chat archival (api/archive.py, manage.py archive_chat_history)
+CHAT_ARCHIVE = {
+    "AFTER_DAYS": int(os.getenv("CHAT_ARCHIVE_AFTER_DAYS", "90")),
+    "BATCH_SIZE": 500,
+    "BATCH_PAUSE": 0.05,  # seconds between batches, lets other writers in
+    "LEVEL": 10,  # zstd level; capped at 9 for the zlib fallback
+    # Run the archival inside the server process (wsgi.py/asgi.py) every N seconds; 0 disables it
+    "INTERVAL": int(os.getenv("CHAT_ARCHIVE_INTERVAL", "0")),
+}
+
+# Persistent WebSocket channel for the glasses client (api/glasses_socket.py)
+GLASSES_SOCKET = {
+    "PATH": "/ws/glasses/",
+    "HEARTBEAT": 20,  # seconds between server pings
+    # Seconds a new connection has to send its auth frame, and an expired token to be replaced
+    "AUTH_TIMEOUT": 10,
+    "IDLE_TIMEOUT": int(os.getenv("GLASSES_SOCKET_IDLE_TIMEOUT", "300")),
+    "MAX_UPLOAD_BYTES": 25 * 1024 * 1024,
+    # Uploads received but not yet claimed by a request, per connection
+    "MAX_PENDING_UPLOADS": 8,
+    "MAX_PENDING_BYTES": 50 * 1024 * 1024,
+    "MAX_REQUESTS": 4,  # requests in flight per connection
+}
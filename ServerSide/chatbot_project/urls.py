@@ -16,16 +16,16 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from django.conf import settings
-from django.conf.urls.static import static
+from api.health_views import HealthzView, ReadyzView
 
 urlpatterns = [
+    # Load balancer probes, no trailing slash so they never redirect
+    path('healthz', HealthzView.as_view(), name='healthz'),
+    path('readyz', ReadyzView.as_view(), name='readyz'),
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
     path('api/users/', include('users.urls')),
 ]
 
-# Add this to serve media files in development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL,
-                          document_root=settings.MEDIA_ROOT)
+# MEDIA_ROOT only holds chat images, which must go through the owner check
+# in api/chat/<id>/image/, so media is deliberately not served here
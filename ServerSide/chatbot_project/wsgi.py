@@ -14,3 +14,15 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chatbot_project.settings')
 
 application = get_wsgi_application()
+
+# Load whisper models in the background; /readyz reports 503 until they are in
+from api.model_registry import start_model_loading  # noqa: E402
+# Periodic upkeep runs in serving processes only, not in migrate, shell or other commands
+from api.archive import start_periodic_archival  # noqa: E402
+from api.tempfiles import start_sweeper  # noqa: E402
+from users.token_cleanup import start_periodic_cleanup  # noqa: E402
+
+start_model_loading()
+start_sweeper()
+start_periodic_cleanup()
+start_periodic_archival()
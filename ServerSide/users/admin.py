@@ -1,6 +1,3 @@
 from django.contrib import admin
 
-<<<<<<< HEAD
 # Register your models here.
-=======
->>>>>>> 5d8cd179cdec0d528e635d1b6117018aa61d326a
@@ -0,0 +1,40 @@
+import copy
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from api.cache import TTLCache
+
+# user id -> User, shared by every CachedJWTAuthentication instance in the process
+user_cache = TTLCache(
+    maxsize=settings.AUTH_USER_CACHE["MAX_SIZE"],
+    ttl=settings.AUTH_USER_CACHE["TTL"],
+)
+
+
+def invalidate_user(user_id):
+    """Drop the cached user so the next request reloads it from the database."""
+    user_cache.pop(str(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that remembers the User behind a validated token.
+
+    Entries live at most AUTH_USER_CACHE["TTL"] seconds and are dropped when
+    the user is saved or deleted, logs out, or has a token blacklisted
+    (see users/signals.py). The cache is per process and so is that
+    invalidation: other workers keep serving their copy until it expires.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+
+        key = str(user_id)
+        user = user_cache.get(key)
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set(key, user)
+        # Hand each request its own instance so nothing leaks between threads
+        return copy.copy(user)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from users.token_cleanup import purge_expired_tokens
+
+
+class Command(BaseCommand):
+    help = "Delete expired outstanding and blacklisted JWT refresh tokens in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None, help="Rows deleted per transaction")
+        parser.add_argument("--pause", type=float, default=None, help="Seconds to sleep between batches")
+
+    def handle(self, *args, **options):
+        result = purge_expired_tokens(batch_size=options["batch_size"], pause=options["pause"])
+        self.stdout.write(
+            f"Removed {result['outstanding']} outstanding and {result['blacklisted']} "
+            f"blacklisted tokens in {result['seconds']}s"
+        )
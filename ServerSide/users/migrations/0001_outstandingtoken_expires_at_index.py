@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('token_blacklist', '0013_alter_blacklistedtoken_options_and_more'),
+    ]
+
+    # token_blacklist ships without an index on expires_at, which the
+    # expired-token cleanup filters on.
+    operations = [
+        migrations.RunSQL(
+            sql="CREATE INDEX IF NOT EXISTS token_blacklist_outstandingtoken_expires_at "
+                "ON token_blacklist_outstandingtoken (expires_at);",
+            reverse_sql="DROP INDEX IF EXISTS token_blacklist_outstandingtoken_expires_at;",
+        ),
+    ]
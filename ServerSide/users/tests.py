@@ -1,3 +1,42 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
 
-# Create your tests here.
+from .authentication import CachedJWTAuthentication, user_cache
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+        self.user = User.objects.create_user("ann", password="pw")
+        self.auth = CachedJWTAuthentication()
+        self.token = self.auth.get_validated_token(str(AccessToken.for_user(self.user)))
+
+    def test_second_lookup_is_served_from_cache(self):
+        self.assertEqual(self.auth.get_user(self.token).pk, self.user.pk)
+        with self.assertNumQueries(0):
+            cached = self.auth.get_user(self.token)
+        self.assertEqual(cached.username, "ann")
+        self.assertIsNot(cached, self.auth.get_user(self.token))
+
+    def test_save_invalidates_cached_user(self):
+        self.auth.get_user(self.token)
+        self.user.first_name = "Ann"
+        self.user.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.auth.get_user(self.token).first_name, "Ann")
+
+    def test_deactivated_user_is_rejected(self):
+        self.auth.get_user(self.token)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.get_user(self.token)
+
+    def test_deleted_user_is_rejected(self):
+        self.auth.get_user(self.token)
+        self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.get_user(self.token)
@@ -0,0 +1,77 @@
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+logger = logging.getLogger(__name__)
+
+
+def _delete_in_batches(queryset, batch_size, pause):
+    """Delete the rows of `queryset` a batch at a time; returns rows removed."""
+    model = queryset.model
+    removed = 0
+    while True:
+        ids = list(queryset.values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return removed
+        # Each batch is its own short transaction so the table is never locked for long
+        deleted, _ = model.objects.filter(id__in=ids).delete()
+        removed += deleted
+        if len(ids) < batch_size:
+            return removed
+        if pause:
+            time.sleep(pause)
+
+
+def purge_expired_tokens(batch_size=None, pause=None):
+    """Remove expired blacklisted and outstanding tokens.
+
+    Returns a dict with the number of rows removed from each table and the
+    time taken in seconds.
+    """
+    config = settings.TOKEN_CLEANUP
+    batch_size = batch_size or config["BATCH_SIZE"]
+    pause = config["BATCH_PAUSE"] if pause is None else pause
+
+    started = time.monotonic()
+    now = aware_utcnow()
+    # Blacklist rows first so the outstanding-token deletes don't cascade into them
+    blacklisted = _delete_in_batches(
+        BlacklistedToken.objects.filter(token__expires_at__lte=now).order_by("id"), batch_size, pause
+    )
+    outstanding = _delete_in_batches(
+        OutstandingToken.objects.filter(expires_at__lte=now).order_by("id"), batch_size, pause
+    )
+    return {
+        "blacklisted": blacklisted,
+        "outstanding": outstanding,
+        "seconds": round(time.monotonic() - started, 3),
+    }
+
+
+def _run_periodically(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            result = purge_expired_tokens()
+            logger.info(
+                f"Token cleanup removed {result['outstanding']} outstanding and "
+                f"{result['blacklisted']} blacklisted tokens in {result['seconds']}s"
+            )
+        except Exception as e:
+            logger.error(f"Token cleanup failed: {str(e)}")
+        finally:
+            close_old_connections()
+
+
+def start_periodic_cleanup():
+    """Start the in-process cleanup thread if TOKEN_CLEANUP["INTERVAL"] is set."""
+    interval = settings.TOKEN_CLEANUP.get("INTERVAL")
+    if not interval:
+        return None
+    thread = threading.Thread(target=_run_periodically, args=(interval,), name="token-cleanup", daemon=True)
+    thread.start()
+    return thread
@@ -7,21 +7,14 @@ from rest_framework import status
 from .serializers import RegisterSerializer
 from django.contrib.auth.models import User
 from rest_framework import generics
-<<<<<<< HEAD
-=======
 from rest_framework_simplejwt.tokens import RefreshToken, TokenError, AccessToken
->>>>>>> 5d8cd179cdec0d528e635d1b6117018aa61d326a
+from .authentication import invalidate_user
 
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = RegisterSerializer
     
 
-<<<<<<< HEAD
-from rest_framework_simplejwt.tokens import RefreshToken, TokenError, AccessToken
-=======
->>>>>>> 5d8cd179cdec0d528e635d1b6117018aa61d326a
-
 class LogoutView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -31,6 +24,7 @@ class LogoutView(APIView):
         try:
             token = RefreshToken(refresh_token)
             token.blacklist()
+            invalidate_user(request.user.pk)
             return Response({"message": "Logout successful"}, status=status.HTTP_205_RESET_CONTENT)
         except TokenError as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)